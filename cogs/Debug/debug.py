@@ -0,0 +1,114 @@
+import disnake
+from disnake.ext import commands
+
+import i18n
+
+from main import CloneVoiceBot
+from db.db import Database
+
+from utils.utils import float_to_str
+
+def ms(seconds: float) -> str:
+    """Returns seconds formatted as milliseconds."""
+    return float_to_str(round(seconds * 1000, 2))
+
+class Debug(commands.Cog):
+    def __init__(self, bot: CloneVoiceBot, db: Database):
+        self.bot = bot
+        self.db = db
+
+    @commands.slash_command(name="debug", description="Show event loop, cache and database diagnostics.")
+    @commands.has_permissions(administrator=True)
+    async def debug(self, inter: disnake.ApplicationCommandInteraction):
+        if (not self.bot.check_guild(inter.guild_id)):
+            return
+
+        loop_stats = self.bot.watchdog.stats()
+        db_stats = self.db.get_connection_stats()
+
+        registration = self.bot.get_cog("Registration")
+        voice_updates = self.bot.get_cog("VoiceUpdates")
+
+        embed = disnake.Embed(
+            title=i18n.t("debug.title"),
+            color=self.bot.help_command_color
+        )
+        embed.add_field(
+            name=i18n.t("debug.fields.loop.name"),
+            value=i18n.t(
+                "debug.fields.loop.value",
+                lag = ms(loop_stats["lag"]),
+                average_lag = ms(loop_stats["average_lag"]),
+                max_lag = ms(loop_stats["max_lag"]),
+                slow_callbacks = loop_stats["slow_callbacks"],
+                pending_tasks = loop_stats["pending_tasks"],
+                latency = ms(self.bot.latency)
+            ),
+            inline=False
+        )
+        embed.add_field(
+            name=i18n.t("debug.fields.gc.name"),
+            value=i18n.t(
+                "debug.fields.gc.value",
+                collections = loop_stats["gc_collections"],
+                total_pause = ms(loop_stats["gc_total_pause"]),
+                max_pause = ms(loop_stats["gc_max_pause"]),
+                last_pause = ms(loop_stats["gc_last_pause"])
+            ),
+            inline=False
+        )
+        embed.add_field(
+            name=i18n.t("debug.fields.caches.name"),
+            value=i18n.t(
+                "debug.fields.caches.value",
+                guilds = len(self.bot.guilds),
+                messages = len(self.bot.cached_messages),
+                active_interactions = len(registration.active_interactions) if registration else 0,
+                user_buckets = len(voice_updates.join_throttle.user_buckets) if voice_updates else 0,
+                parent_buckets = len(voice_updates.join_throttle.parent_buckets) if voice_updates else 0,
+                pending_session_events = len(voice_updates.pending_session_events) if voice_updates else 0
+            ),
+            inline=False
+        )
+        embed.add_field(
+            name=i18n.t("debug.fields.database.name"),
+            value=i18n.t(
+                "debug.fields.database.value",
+                size = float_to_str(round(db_stats["size"] / 1024, 1)),
+                page_count = db_stats["page_count"],
+                freelist_count = db_stats["freelist_count"],
+                total_changes = db_stats["total_changes"],
+                in_transaction = db_stats["in_transaction"]
+            ),
+            inline=False
+        )
+
+        maintenance = self.bot.get_cog("Maintenance")
+        if (maintenance and maintenance.reports):
+            embed.add_field(
+                name=i18n.t("debug.fields.maintenance.name"),
+                value="\n".join(
+                    i18n.t(
+                        "debug.fields.maintenance.row_template",
+                        operation = operation,
+                        duration = ms(report["duration"]),
+                        size = float_to_str(round(report["size_after"] / 1024, 1)),
+                        finished_at = int(report["finished_at"])
+                    )
+                    for operation, report in maintenance.reports.items()
+                ),
+                inline=False
+            )
+
+        if (voice_updates and voice_updates.dispatcher):
+            embed.add_field(
+                name=i18n.t("debug.fields.workers.name"),
+                value=i18n.t("debug.fields.workers.value", **voice_updates.dispatcher.stats()),
+                inline=False
+            )
+
+        await inter.response.send_message(embed=embed, ephemeral=True)
+
+def setup(bot: CloneVoiceBot):
+    from main import db
+    bot.add_cog(Debug(bot, db))
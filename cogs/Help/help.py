@@ -59,6 +59,30 @@ class Help(commands.Cog):
             ), 
             inline=True
         )
+        embed.add_field(
+            name=i18n.t("help.fields.set_parent_throttle.name"), 
+            value=i18n.t(
+                "help.fields.set_parent_throttle.value", 
+                command_mention = self.bot.get_command_mention("set_parent_throttle")
+            ), 
+            inline=True
+        )
+        embed.add_field(
+            name=i18n.t("help.fields.export_parent_voices.name"), 
+            value=i18n.t(
+                "help.fields.export_parent_voices.value", 
+                command_mention = self.bot.get_command_mention("export_parent_voices")
+            ), 
+            inline=True
+        )
+        embed.add_field(
+            name=i18n.t("help.fields.import_parent_voices.name"), 
+            value=i18n.t(
+                "help.fields.import_parent_voices.value", 
+                command_mention = self.bot.get_command_mention("import_parent_voices")
+            ), 
+            inline=True
+        )
         embed.add_field(
             name=i18n.t("help.fields.parent_channels_list.name"), 
             value=i18n.t(
@@ -67,6 +91,22 @@ class Help(commands.Cog):
             ), 
             inline=True
         )
+        embed.add_field(
+            name=i18n.t("help.fields.voice_stats.name"), 
+            value=i18n.t(
+                "help.fields.voice_stats.value", 
+                command_mention = self.bot.get_command_mention("voice_stats")
+            ), 
+            inline=True
+        )
+        embed.add_field(
+            name=i18n.t("help.fields.debug.name"), 
+            value=i18n.t(
+                "help.fields.debug.value", 
+                command_mention = self.bot.get_command_mention("debug")
+            ), 
+            inline=True
+        )
 
         await inter.response.send_message(embed=embed, ephemeral=False)
 
@@ -75,20 +115,16 @@ class Help(commands.Cog):
         if (not self.bot.check_guild(inter.guild_id)):
             return
         
-        all_parent_channels = self.db.get_all_parent_voices_from_guild(inter.guild_id)
         description = ""
-        if (len(all_parent_channels) == 0):
+        for parent_voice in self.db.get_all_parent_voices_from_guild(inter.guild_id):
+            channel_mention = self.bot.get_channel_mention(parent_voice.channel_id)
+            description += i18n.t(
+                "parent_channels_list.row_template",
+                channel_mention = channel_mention,
+                name_template = parent_voice.name_template
+            )
+        if (not description):
             description = i18n.t("parent_channels_list.no_channels")
-        else:
-            for data in all_parent_channels:
-                channel_id = data["channel_id"]
-                name_template = data["name_template"]
-                channel_mention = self.bot.get_channel_mention(channel_id)
-                description += i18n.t(
-                    "parent_channels_list.row_template",
-                    channel_mention = channel_mention,
-                    name_template = name_template
-                )
         if (len(description) < 4096): # Discord's description length limit
             embed = disnake.Embed(
                 title=i18n.t("parent_channels_list.title"),
@@ -0,0 +1,97 @@
+from disnake.ext import commands, tasks
+import asyncio
+import logging
+import time
+from typing import Any, Dict
+
+from main import CloneVoiceBot
+from db.db import Database
+from db.maintenance import DatabaseMaintenance
+
+logger = logging.getLogger(__name__)
+
+class Maintenance(commands.Cog):
+    def __init__(
+        self,
+        bot: CloneVoiceBot,
+        db: Database,
+        maintenance: DatabaseMaintenance,
+        quiet_period: float,
+        backup_interval: float
+    ):
+        self.bot = bot
+        self.db = db
+        self.maintenance = maintenance
+
+        self.quiet_period = quiet_period # in seconds
+
+        # Stores operation: interval in seconds
+        self.schedule = {
+            "checkpoint": 5 * 60,
+            "incremental_vacuum": 60 * 60,
+            "optimize": 6 * 60 * 60,
+            "analyze": 24 * 60 * 60,
+        }
+        if (maintenance.backup_path):
+            self.schedule["backup"] = backup_interval
+
+        # Stores operation: monotonic time of the last run
+        self.last_runs: Dict[str, float] = {}
+        # Stores operation: report of the last run
+        self.reports: Dict[str, Dict[str, Any]] = {}
+
+        self.maintenance_task = self.run_maintenance.start()
+
+    def cog_unload(self):
+        self.maintenance_task.cancel()
+
+    def is_quiet(self) -> bool:
+        """Check if there were no voice events for quiet_period seconds and no clone is being created."""
+        voice_updates = self.bot.get_cog("VoiceUpdates")
+        if (voice_updates is None):
+            return True
+        if (voice_updates.clone_flows):
+            return False
+        return time.monotonic() - voice_updates.last_event_time >= self.quiet_period
+
+    def run_operation(self, operation: str) -> Dict[str, Any]:
+        """Run a maintenance operation, called on a worker thread."""
+        if (operation == "checkpoint"):
+            return self.maintenance.checkpoint()
+        if (operation == "incremental_vacuum"):
+            return self.maintenance.incremental_vacuum()
+        if (operation == "optimize"):
+            return self.maintenance.optimize()
+        if (operation == "analyze"):
+            return self.maintenance.optimize(analyze=True)
+        return self.maintenance.backup()
+
+    @tasks.loop(seconds=30)
+    async def run_maintenance(self):
+        """Regularly run the due maintenance operations while the bot is quiet"""
+        for operation, interval in self.schedule.items():
+            last_run = self.last_runs.get(operation)
+            if (last_run is not None and time.monotonic() - last_run < interval):
+                continue
+            # Checked before every operation, since voice events may arrive while the previous one runs
+            if (not self.is_quiet()):
+                return
+
+            self.last_runs[operation] = time.monotonic()
+            try:
+                report = await asyncio.to_thread(self.run_operation, operation)
+            except Exception:
+                logger.exception("Database maintenance operation %s failed", operation)
+                continue
+
+            report["finished_at"] = time.time()
+            self.reports[operation] = report
+            logger.info("Database maintenance operation %s finished", operation, extra=report)
+
+def setup(bot: CloneVoiceBot):
+    from main import db, DB_BACKUP_PATH, DB_BACKUP_INTERVAL_HOURS, MAINTENANCE_QUIET_SECONDS
+    if (db.db_path == ':memory:'):
+        # An in-memory database can't be opened from other connections
+        return
+    maintenance = DatabaseMaintenance(db.db_path, backup_path=DB_BACKUP_PATH)
+    bot.add_cog(Maintenance(bot, db, maintenance, MAINTENANCE_QUIET_SECONDS, DB_BACKUP_INTERVAL_HOURS * 60 * 60))
@@ -3,6 +3,8 @@ from disnake.ext import commands, tasks
 from disnake import TextInputStyle
 from datetime import datetime, timedelta
 from typing import Optional
+import tempfile
+import time
 
 import i18n
 
@@ -10,6 +12,8 @@ from main import CloneVoiceBot
 from db.db import Database
 
 from utils.utils import float_to_str
+from utils.cleanup import delete_channels
+from cogs.Registration.transfer import write_parent_voices, parse_parent_voices, validate_parent_voices
 
 class Registration(commands.Cog):
     def __init__(self, bot: CloneVoiceBot, db: Database):
@@ -18,10 +22,19 @@ class Registration(commands.Cog):
 
         # Stores message_id: (author_id, expiry_time)
         self.active_interactions = {}
+        # Stores message_id: channel_id, so messages that are not cached (e.g. after a restart) can be fetched
+        self.interaction_channels = {}
         self.cleanup_task = self.cleanup_expired_interactions.start()
 
         self.timeout = 120 # in seconds
 
+        # Cleanup progress is shown for parent voices with at least this many empty clones
+        self.cleanup_progress_threshold = 20
+        self.cleanup_progress_interval = 2 # in seconds
+
+        self.max_import_size = 8 * 1024 * 1024 # in bytes
+        self.max_reported_import_errors = 10
+
     def cog_unload(self):
         self.cleanup_task.cancel()
 
@@ -38,6 +51,12 @@ class Registration(commands.Cog):
         for msg_id in to_remove:
             await self.disable_message(msg_id)
             del self.active_interactions[msg_id]
+            self.interaction_channels.pop(msg_id, None)
+
+    @cleanup_expired_interactions.before_loop
+    async def before_cleanup_expired_interactions(self):
+        # Interactions restored from a snapshot may have expired while the bot was down, they are disabled once it is connected
+        await self.bot.wait_until_ready()
 
     def refresh_interaction_timeout(self, message_id: int):
         """Refresh expiry time of an active interaction."""
@@ -141,7 +160,14 @@ class Registration(commands.Cog):
         """Disable buttons after timeout period"""
         message = self.bot.get_message(message_id)
         if (not message):
-            return
+            # Setup messages restored after a restart are not in the message cache
+            channel_id = self.interaction_channels.get(message_id)
+            if (channel_id is None):
+                return
+            try:
+                message = await self.bot.get_partial_messageable(channel_id).fetch_message(message_id)
+            except disnake.HTTPException:
+                return  # Message was deleted or can't be read anymore
         # Edit the message to remove components and update embed
         try:
             embed = message.embeds[0]
@@ -216,6 +242,7 @@ class Registration(commands.Cog):
             None,
             None,
         )
+        self.interaction_channels[message.id] = message.channel.id
 
     @commands.slash_command(description="Edit an existing parent voice channel or create a new one.")
     @commands.has_permissions(manage_guild=True)
@@ -250,12 +277,12 @@ class Registration(commands.Cog):
         )
         embed.add_field(
             name=i18n.t("registration.fields.parent_channel.name"),
-            value=f"<#{result['channel_id']}>",
+            value=f"<#{result.channel_id}>",
             inline=False,
         )
         embed.add_field(
             name=i18n.t("registration.fields.name_template.name"),
-            value=f"`{result['name_template']}`" if result['name_template'] else i18n.t("registration.not_set"),
+            value=f"`{result.name_template}`" if result.name_template else i18n.t("registration.not_set"),
             inline=False,
         )
 
@@ -293,9 +320,10 @@ class Registration(commands.Cog):
         self.active_interactions[message.id] = (
             inter.author.id,
             expiry_time,
-            result['channel_id'],
-            result['name_template']
+            result.channel_id,
+            result.name_template
         )
+        self.interaction_channels[message.id] = message.channel.id
 
     @commands.slash_command(description="Delete an existing parent voice from database.")
     @commands.has_permissions(manage_guild=True)
@@ -317,13 +345,154 @@ class Registration(commands.Cog):
             )
             return
 
-        self.db.delete_parent_voice(channel_id=channel.id)
+        await inter.response.defer()
+
+        # Empty clones are deleted right away, populated ones stay registered and are deleted once they are empty
+        empty_clones = []
+        for temp_voice in self.db.get_temporary_voices_of_parent(channel.id):
+            clone_channel = inter.guild.get_channel(temp_voice.channel_id)
+            if (clone_channel is None or len(clone_channel.members) == 0):
+                empty_clones.append((temp_voice, clone_channel))
+
+        self.db.delete_parent_voice_cascade(channel.id, [temp_voice.channel_id for temp_voice, _ in empty_clones])
+
+        voice_updates = self.bot.get_cog("VoiceUpdates")
+        if (voice_updates):
+            for temp_voice, _ in empty_clones:
+                voice_updates.record_session_event(temp_voice.channel_id, temp_voice.parent_voice_id, temp_voice.guild_id, "delete")
+
+        channels = [clone_channel for _, clone_channel in empty_clones if clone_channel is not None]
+        on_progress = None
+        if (len(channels) >= self.cleanup_progress_threshold):
+            last_update = 0
+
+            async def on_progress(done: int, total: int):
+                nonlocal last_update
+                if (done < total and time.monotonic() - last_update < self.cleanup_progress_interval):
+                    return
+                last_update = time.monotonic()
+                try:
+                    await inter.edit_original_message(
+                        content=i18n.t("registration.cleanup.progress", done = done, total = total)
+                    )
+                except disnake.HTTPException:
+                    pass
+
+        await delete_channels(channels, i18n.t("registration.cleanup.reason"), on_progress=on_progress)
+
+        await inter.edit_original_message(
+            content=i18n.t("registration.submit.delete", channel_mention = channel.mention)
+        )
+        
+
+    @commands.slash_command(description="Set clone throttling limits of an existing parent voice.")
+    @commands.has_permissions(manage_guild=True)
+    async def set_parent_throttle(
+        self,
+        inter: disnake.ApplicationCommandInteraction,
+        channel: disnake.VoiceChannel = commands.Param(description="Parent voice channel to configure"),
+        user_joins: Optional[int] = commands.Param(default=None, min_value=1, description="Clones one user may create per user period (optional)"),
+        user_period: Optional[float] = commands.Param(default=None, gt=0, description="User period in seconds (optional)"),
+        parent_joins: Optional[int] = commands.Param(default=None, min_value=1, description="Clones that may be created per parent period (optional)"),
+        parent_period: Optional[float] = commands.Param(default=None, gt=0, description="Parent period in seconds (optional)")
+    ):
+        """Sets clone throttling limits of a parent voice channel, omitted limits fall back to the defaults."""
+        if (not self.bot.check_guild(inter.guild_id)):
+            return
+
+        # Check if channel is a registered parent voice
+        result = self.db.get_parent_voice(channel.id)
+        if result is None:
+            await inter.response.send_message(
+                i18n.t("registration.not_registered"),
+                ephemeral=True
+            )
+            return
+
+        self.db.update_parent_voice_throttle(channel.id, user_joins, user_period, parent_joins, parent_period)
 
+        default = i18n.t("registration.throttle.default")
         await inter.response.send_message(
-            i18n.t("registration.submit.delete", channel_mention = channel.mention),
+            i18n.t(
+                "registration.throttle.success",
+                channel_mention = channel.mention,
+                user_joins = default if user_joins is None else user_joins,
+                user_period = default if user_period is None else float_to_str(user_period),
+                parent_joins = default if parent_joins is None else parent_joins,
+                parent_period = default if parent_period is None else float_to_str(parent_period)
+            ),
             ephemeral=False
         )
-        
+
+    @commands.slash_command(description="Export all parent voices of this guild as a file.")
+    @commands.has_permissions(manage_guild=True)
+    async def export_parent_voices(
+        self,
+        inter: disnake.ApplicationCommandInteraction,
+        file_format: str = commands.Param(name="format", default="json", choices=["json", "csv"], description="File format")
+    ):
+        """Exports all parent voice channels of the guild, rows are written to the file as they are read."""
+        if (not self.bot.check_guild(inter.guild_id)):
+            return
+
+        await inter.response.defer()
+
+        # Kept in memory unless the export grows large, then spilled to disk
+        file = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        count = write_parent_voices(self.db.get_all_parent_voices_from_guild(inter.guild_id), file_format, file)
+        file.seek(0)
+
+        await inter.edit_original_message(
+            content=i18n.t("registration.transfer.export_success", count = count),
+            file=disnake.File(file, filename=f"parent_voices.{file_format}")
+        )
+        file.close()
+
+    @commands.slash_command(description="Import parent voices of this guild from an exported file.")
+    @commands.has_permissions(manage_guild=True)
+    async def import_parent_voices(
+        self,
+        inter: disnake.ApplicationCommandInteraction,
+        file: disnake.Attachment = commands.Param(description="JSON or CSV file made by /export_parent_voices")
+    ):
+        """Imports parent voice channels from a file, adding new ones and updating existing ones."""
+        if (not self.bot.check_guild(inter.guild_id)):
+            return
+
+        if (file.size > self.max_import_size):
+            await inter.response.send_message(
+                i18n.t("registration.transfer.too_large", megabytes = float_to_str(self.max_import_size / 1024 / 1024)),
+                ephemeral=True
+            )
+            return
+
+        await inter.response.defer()
+
+        file_format = "csv" if file.filename.lower().endswith(".csv") else "json"
+        try:
+            rows = parse_parent_voices(await file.read(), file_format)
+        except (UnicodeDecodeError, ValueError) as e:
+            await inter.edit_original_message(content=i18n.t("registration.transfer.malformed", error = str(e)))
+            return
+
+        voice_channel_ids = {channel.id for channel in inter.guild.voice_channels}
+        parent_voices, errors = validate_parent_voices(rows, voice_channel_ids)
+        if (errors):
+            # Nothing is imported unless the whole file is valid
+            description = "".join(
+                i18n.t("registration.transfer.error_row", row = row, error = i18n.t(f"registration.transfer.errors.{error}"))
+                for row, error in errors[:self.max_reported_import_errors]
+            )
+            await inter.edit_original_message(
+                content=i18n.t("registration.transfer.invalid", count = len(errors)) + description
+            )
+            return
+
+        self.db.upsert_parent_voices(inter.guild_id, parent_voices)
+
+        await inter.edit_original_message(
+            content=i18n.t("registration.transfer.import_success", count = len(parent_voices))
+        )
 
     @commands.Cog.listener()
     async def on_button_click(self, inter: disnake.MessageInteraction):
@@ -340,6 +509,7 @@ class Registration(commands.Cog):
         # Check if interaction is expired
         if datetime.now() > expiry_time:
             del self.active_interactions[inter.message.id]
+            self.interaction_channels.pop(inter.message.id, None)
             await inter.response.send_message(
                 i18n.t("registration.interaction_expired"), 
                 ephemeral=True
@@ -0,0 +1,107 @@
+import csv
+import io
+import json
+import math
+from typing import Any, BinaryIO, Dict, Iterable, List, Optional, Set, Tuple
+
+from db.records import ParentVoice
+
+# Columns of an exported parent voice, guild_id is implied by the guild the file is imported to
+FIELDS = ("channel_id", "name_template", "user_joins", "user_period", "parent_joins", "parent_period")
+
+MAX_TEMPLATE_LENGTH = 100
+# Largest integer SQLite can store
+MAX_JOINS = 2**63 - 1
+
+def write_parent_voices(parent_voices: Iterable[ParentVoice], file_format: str, file: BinaryIO) -> int:
+    """Write parent voices to a binary file one row at a time. Returns the number of written rows."""
+    text = io.TextIOWrapper(file, encoding="utf-8", newline="", write_through=True)
+    count = 0
+    if (file_format == "csv"):
+        writer = csv.writer(text)
+        writer.writerow(FIELDS)
+        for parent_voice in parent_voices:
+            writer.writerow(["" if value is None else value for value in (getattr(parent_voice, field) for field in FIELDS)])
+            count += 1
+    else:
+        text.write("[")
+        for parent_voice in parent_voices:
+            row = {field: getattr(parent_voice, field) for field in FIELDS}
+            # Channel IDs are written as strings, since JSON numbers lose precision above 2^53 in most readers
+            row["channel_id"] = str(row["channel_id"])
+            text.write(("," if count else "") + "\n    " + json.dumps(row, ensure_ascii=False))
+            count += 1
+        text.write("\n]\n")
+    text.detach()
+    return count
+
+def parse_parent_voices(data: bytes, file_format: str) -> List[Dict[str, Any]]:
+    """Parse rows of an imported JSON or CSV file. Raises ValueError if the file is malformed."""
+    content = data.decode("utf-8-sig")
+    if (file_format == "csv"):
+        return list(csv.DictReader(io.StringIO(content)))
+    rows = json.loads(content)
+    if (not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows)):
+        raise ValueError("expected a list of objects")
+    return rows
+
+def _parse_number(value: Any, number_type: type) -> Optional[Any]:
+    if (value is None or value == ""):
+        return None
+    if (isinstance(value, bool)):
+        raise TypeError("must be a number")
+    number = float(value)
+    # Infinite periods break token bucket refills and NaN disables the throttle silently
+    if (not math.isfinite(number) or number <= 0):
+        raise ValueError("must be positive and finite")
+    if (number_type is int):
+        if (not number.is_integer()):
+            raise ValueError("must be integral")
+        if (number > MAX_JOINS):
+            raise ValueError("too large")
+        return int(number)
+    return number
+
+def validate_parent_voices(
+    rows: List[Dict[str, Any]],
+    voice_channel_ids: Set[int]
+) -> Tuple[List[Tuple[int, str, Optional[int], Optional[float], Optional[int], Optional[float]]], List[Tuple[int, str]]]:
+    """
+    Check all rows against the guild's voice channels in a single pass.
+    Returns the parent voices ready to be stored and a list of (row number, error) pairs.
+    """
+    parent_voices = []
+    errors = []
+    seen: Set[int] = set()
+    for number, row in enumerate(rows, start=1):
+        try:
+            channel_id = int(row.get("channel_id"))
+        except (TypeError, ValueError):
+            errors.append((number, "channel_id"))
+            continue
+        if (channel_id not in voice_channel_ids):
+            errors.append((number, "channel_id"))
+            continue
+        if (channel_id in seen):
+            errors.append((number, "duplicate"))
+            continue
+        seen.add(channel_id)
+
+        name_template = row.get("name_template")
+        if (not isinstance(name_template, str) or not name_template or len(name_template) > MAX_TEMPLATE_LENGTH):
+            errors.append((number, "name_template"))
+            continue
+
+        try:
+            limits = (
+                _parse_number(row.get("user_joins"), int),
+                _parse_number(row.get("user_period"), float),
+                _parse_number(row.get("parent_joins"), int),
+                _parse_number(row.get("parent_period"), float),
+            )
+        except (TypeError, ValueError, OverflowError):
+            errors.append((number, "limits"))
+            continue
+
+        parent_voices.append((channel_id, name_template, *limits))
+    return parent_voices, errors
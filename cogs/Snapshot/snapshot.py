@@ -0,0 +1,175 @@
+from disnake.ext import commands, tasks
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import List
+
+from main import CloneVoiceBot
+from db.db import Database
+from db.records import TemporaryVoice
+from utils.snapshot import (
+    InteractionTimer,
+    ParentBucketState,
+    UserBucketState,
+    VoiceSnapshot,
+    read_snapshot,
+    write_snapshot,
+)
+
+logger = logging.getLogger(__name__)
+
+class Snapshot(commands.Cog):
+    """
+    Saves the state that lives only in memory (setup message expiries, join throttle buckets and deletions
+    of empty clones in progress) to a snapshot file, and restores it on startup. The snapshot is only used
+    if the database has not changed since it was written, otherwise the bot starts cold.
+    """
+
+    def __init__(self, bot: CloneVoiceBot, db: Database, path: str, interval: float):
+        self.bot = bot
+        self.db = db
+        self.path = path
+
+        # Deletions restored from the snapshot, resumed once the channel cache is ready
+        self.restored_deletions: List[TemporaryVoice] = []
+        self.resumed = False
+        self.restore()
+
+        self.save_snapshot.change_interval(seconds=interval)
+        self.save_task = self.save_snapshot.start()
+
+    def cog_unload(self):
+        self.save_task.cancel()
+
+    def restore(self) -> bool:
+        """Load the snapshot into the other cogs. Returns False if there was no up to date snapshot."""
+        snapshot = read_snapshot(self.path)
+        if (snapshot is None):
+            logger.info("No valid snapshot, starting cold", extra={"path": self.path})
+            return False
+        generation = self.db.get_generation()
+        if (snapshot.generation != generation):
+            logger.info(
+                "Snapshot is outdated, starting cold",
+                extra={"snapshot_generation": snapshot.generation, "generation": generation}
+            )
+            return False
+
+        registration = self.bot.get_cog("Registration")
+        if (registration):
+            for interaction in snapshot.interactions:
+                registration.active_interactions[interaction.message_id] = (
+                    interaction.author_id,
+                    datetime.fromtimestamp(interaction.expires_at),
+                    interaction.parent_id,
+                    interaction.name_template
+                )
+                if (interaction.channel_id):
+                    registration.interaction_channels[interaction.message_id] = interaction.channel_id
+
+        voice_updates = self.bot.get_cog("VoiceUpdates")
+        if (voice_updates):
+            # Bucket times are saved as unix time, since the monotonic clock starts over with the process
+            offset = time.monotonic() - time.time()
+            join_throttle = voice_updates.join_throttle
+            for bucket in snapshot.user_buckets:
+                join_throttle.user_buckets.restore(
+                    (bucket.user_id, bucket.parent_id),
+                    bucket.tokens, bucket.updated_at + offset, bucket.full_at + offset, bucket.clone_id
+                )
+            for bucket in snapshot.parent_buckets:
+                join_throttle.parent_buckets.restore(
+                    bucket.parent_id,
+                    bucket.tokens, bucket.updated_at + offset, bucket.full_at + offset, bucket.clone_id
+                )
+            self.restored_deletions = snapshot.deletions
+
+        logger.info(
+            "Restored snapshot, starting warm",
+            extra={
+                "age": round(time.time() - snapshot.written_at, 3),
+                "interactions": len(snapshot.interactions),
+                "user_buckets": len(snapshot.user_buckets),
+                "parent_buckets": len(snapshot.parent_buckets),
+                "deletions": len(snapshot.deletions)
+            }
+        )
+        return True
+
+    def capture(self) -> VoiceSnapshot:
+        """Collect the in-memory state of the other cogs."""
+        interactions = []
+        registration = self.bot.get_cog("Registration")
+        if (registration):
+            interactions = [
+                InteractionTimer(
+                    message_id,
+                    registration.interaction_channels.get(message_id),
+                    author_id,
+                    expiry.timestamp(),
+                    parent_id,
+                    name_template
+                )
+                for message_id, (author_id, expiry, parent_id, name_template) in registration.active_interactions.items()
+            ]
+
+        user_buckets = []
+        parent_buckets = []
+        deletions = [] if self.resumed else list(self.restored_deletions)
+        voice_updates = self.bot.get_cog("VoiceUpdates")
+        if (voice_updates):
+            offset = time.time() - time.monotonic()
+            join_throttle = voice_updates.join_throttle
+            user_buckets = [
+                UserBucketState(user_id, parent_id, bucket.tokens, bucket.updated + offset, bucket.full_at + offset, bucket.clone_id)
+                for (user_id, parent_id), bucket in join_throttle.user_buckets.buckets.items()
+            ]
+            parent_buckets = [
+                ParentBucketState(parent_id, bucket.tokens, bucket.updated + offset, bucket.full_at + offset, bucket.clone_id)
+                for parent_id, bucket in join_throttle.parent_buckets.buckets.items()
+            ]
+            deletions.extend(voice_updates.pending_deletions.values())
+
+        return VoiceSnapshot(
+            self.db.get_generation(),
+            time.time(),
+            interactions,
+            user_buckets,
+            parent_buckets,
+            deletions
+        )
+
+    def save(self) -> int:
+        """Write the snapshot right away, used on shutdown. Returns its size."""
+        return write_snapshot(self.path, self.capture())
+
+    @tasks.loop(seconds=60)
+    async def save_snapshot(self):
+        """Regularly write the snapshot, so it survives a crash"""
+        try:
+            snapshot = self.capture()
+            await asyncio.to_thread(write_snapshot, self.path, snapshot)
+        except Exception:
+            # Any error would stop the loop for good, the snapshot is written on the next run instead
+            logger.exception("Error saving snapshot", extra={"path": self.path})
+
+    @save_snapshot.before_loop
+    async def before_save_snapshot(self):
+        await self.bot.wait_until_ready()
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        if (self.resumed):
+            return
+        self.resumed = True
+        voice_updates = self.bot.get_cog("VoiceUpdates")
+        if (voice_updates and self.restored_deletions):
+            await voice_updates.resume_deletions(self.restored_deletions)
+        self.restored_deletions = []
+
+def setup(bot: CloneVoiceBot):
+    from main import db, SNAPSHOT_PATH, SNAPSHOT_INTERVAL_SECONDS
+    if (not SNAPSHOT_PATH):
+        return
+    bot.add_cog(Snapshot(bot, db, SNAPSHOT_PATH, SNAPSHOT_INTERVAL_SECONDS))
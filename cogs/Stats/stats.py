@@ -0,0 +1,119 @@
+import disnake
+from disnake.ext import commands, tasks
+from typing import Optional
+import io
+import logging
+import time
+
+import i18n
+
+from main import CloneVoiceBot
+from db.db import Database
+
+from utils.utils import float_to_str
+
+logger = logging.getLogger(__name__)
+
+class Stats(commands.Cog):
+    def __init__(self, bot: CloneVoiceBot, db: Database, retention_days: float):
+        self.bot = bot
+        self.db = db
+
+        self.retention = retention_days * 24 * 60 * 60 # in seconds
+        self.prune_task = self.prune_session_events.start()
+
+    def cog_unload(self):
+        self.prune_task.cancel()
+
+    @tasks.loop(hours=1)
+    async def prune_session_events(self):
+        """Regularly drop raw session events that are already rolled up into the aggregates"""
+        try:
+            self.db.prune_voice_session_events(time.time() - self.retention)
+        except Exception:
+            # Any error would stop the loop for good, the events are pruned on the next run instead
+            logger.exception("Error pruning session events")
+
+    def format_parent_stats(self, parent_voice_id: int) -> str:
+        """Returns formatted all-time and current hour statistics of a parent voice channel."""
+        total = self.db.get_voice_stats(parent_voice_id)
+        if (total is None):
+            return i18n.t("voice_stats.no_data")
+
+        now = time.time()
+        hour = int(now // 3600) * 3600
+        hourly = self.db.get_hourly_voice_stats(parent_voice_id, hour)
+
+        average_lifetime = (
+            total.total_lifetime / total.clones_deleted
+            if total.clones_deleted > 0
+            else 0
+        )
+
+        text = i18n.t(
+            "voice_stats.total_template",
+            clones_created = total.clones_created,
+            active = total.active,
+            peak_concurrency = total.peak_concurrency,
+            average_lifetime = float_to_str(round(average_lifetime / 60, 1))
+        )
+        if (hourly is not None):
+            text += i18n.t(
+                "voice_stats.hourly_template",
+                clones_created = hourly.clones_created,
+                clones_deleted = hourly.clones_deleted,
+                peak_concurrency = hourly.peak_concurrency
+            )
+        return text
+
+    @commands.slash_command(name="voice_stats", description="Show clone statistics of parent voice channels.")
+    @commands.has_permissions(manage_guild=True)
+    async def voice_stats(
+        self,
+        inter: disnake.ApplicationCommandInteraction,
+        channel: Optional[disnake.VoiceChannel] = commands.Param(default=None, description="Parent voice channel to show statistics for (optional)")
+    ):
+        if (not self.bot.check_guild(inter.guild_id)):
+            return
+
+        if (channel is not None):
+            if (self.db.get_parent_voice(channel.id) is None):
+                await inter.response.send_message(
+                    i18n.t("registration.not_registered"),
+                    ephemeral=True
+                )
+                return
+            description = i18n.t(
+                "voice_stats.row_template",
+                channel_mention = channel.mention,
+                stats = self.format_parent_stats(channel.id)
+            )
+        else:
+            description = ""
+            for parent_voice in self.db.get_all_parent_voices_from_guild(inter.guild_id):
+                description += i18n.t(
+                    "voice_stats.row_template",
+                    channel_mention = self.bot.get_channel_mention(parent_voice.channel_id),
+                    stats = self.format_parent_stats(parent_voice.channel_id)
+                )
+            if (not description):
+                description = i18n.t("parent_channels_list.no_channels")
+
+        if (len(description) < 4096): # Discord's description length limit
+            embed = disnake.Embed(
+                title=i18n.t("voice_stats.title"),
+                description=description,
+                color=self.bot.help_command_color
+            )
+            await inter.response.send_message(embed=embed, ephemeral=False)
+        else:
+            file_content = io.StringIO(i18n.t("voice_stats.title") + description)
+            file_content.seek(0)
+
+            await inter.response.send_message(
+                file=disnake.File(file_content, filename="voice_stats.txt")
+            )
+
+def setup(bot: CloneVoiceBot):
+    from main import db, VOICE_STATS_RETENTION_DAYS
+    bot.add_cog(Stats(bot, db, VOICE_STATS_RETENTION_DAYS))
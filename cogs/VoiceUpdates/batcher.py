@@ -0,0 +1,102 @@
+import disnake
+import asyncio
+import logging
+from typing import Dict, List, Optional, Set, Tuple, TYPE_CHECKING
+
+from utils.tracing import trace
+
+if TYPE_CHECKING:
+    from cogs.VoiceUpdates.voiceUpdates import VoiceUpdates
+
+logger = logging.getLogger(__name__)
+
+VoiceEvent = Tuple[disnake.Member, disnake.VoiceState, disnake.VoiceState]
+
+class VoiceEventBatcher:
+    """
+    Buffers voice events for a short window, so bursts of them (mass moves, reconnects after a resume)
+    share one lookup of parent and temporary voices per table instead of a few point lookups per event.
+    The window starts at zero, so a single event is handled on the next loop iteration, doubles while
+    batches keep coming with more than one event and halves back down once they don't.
+    """
+
+    def __init__(self, cog: "VoiceUpdates", max_window: float = 0.02, min_window: float = 0.001):
+        self.cog = cog
+        self.max_window = max_window
+        self.min_window = min_window
+
+        self.window = 0.0
+        self.pending: List[VoiceEvent] = []
+        self.flush_handle: Optional[asyncio.TimerHandle] = None
+        # Keeps references to running batches, so they are not garbage collected
+        self.batch_tasks: Set[asyncio.Task] = set()
+
+    def submit(self, member: disnake.Member, before: disnake.VoiceState, after: disnake.VoiceState) -> None:
+        """Add a voice event to the current batch."""
+        self.pending.append((member, before, after))
+        if (self.flush_handle is None):
+            self.flush_handle = asyncio.get_running_loop().call_later(self.window, self.flush)
+
+    def flush(self) -> None:
+        """Close the current batch and start processing it."""
+        self.flush_handle = None
+        events, self.pending = self.pending, []
+
+        if (len(events) > 1):
+            self.window = min(self.max_window, max(self.window * 2, self.min_window))
+        elif (self.window > self.min_window):
+            self.window /= 2
+        else:
+            self.window = 0.0
+
+        task = asyncio.get_running_loop().create_task(self.process(events))
+        self.batch_tasks.add(task)
+        task.add_done_callback(self.batch_tasks.discard)
+
+    def close(self) -> None:
+        """Drop the events that are not processed yet."""
+        if (self.flush_handle is not None):
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        self.pending = []
+
+    async def process(self, events: List[VoiceEvent]) -> None:
+        """Resolve all channels of the batch at once, then handle every member's events in order, members concurrently."""
+        with trace("voice_event_batch", size=len(events)):
+            parent_ids = {after.channel.id for _, before, after in events if after.channel and before.channel != after.channel}
+            temporary_ids = {before.channel.id for _, before, _ in events if before.channel}
+            parent_results = self.cog.db.get_parent_voices(list(parent_ids)) if parent_ids else {}
+            temp_voice_results = self.cog.db.get_temporary_voices(list(temporary_ids)) if temporary_ids else {}
+
+            # Members' events are grouped, since a later event may cancel a clone that an earlier one is creating
+            member_events: Dict[int, List[VoiceEvent]] = {}
+            for member, before, after in events:
+                self.cog.cancel_stale_clone_flow(member, after)
+                member_events.setdefault(member.id, []).append((member, before, after))
+
+            results = await asyncio.gather(
+                *(self.process_member(member_batch, parent_results, temp_voice_results) for member_batch in member_events.values()),
+                return_exceptions=True
+            )
+            for result in results:
+                if (isinstance(result, Exception)):
+                    logger.error("Error handling voice event", exc_info=result)
+
+    async def process_member(self, events: List[VoiceEvent], parent_results: dict, temp_voice_results: dict) -> None:
+        # Events that don't change the channel (mute, stream or video toggles) neither create nor cancel clones
+        last_move = max(
+            (index for index, (_, before, after) in enumerate(events) if before.channel != after.channel),
+            default=-1
+        )
+        for index, (member, before, after) in enumerate(events):
+            with trace(
+                "voice_state_update",
+                guild_id=member.guild.id,
+                member_id=member.id,
+                before_channel_id=before.channel.id if before.channel else None,
+                after_channel_id=after.channel.id if after.channel else None
+            ):
+                # A member who changes channel later in the batch has already left, so only their last move may create a clone
+                await self.cog.handle_voice_state_update(
+                    member, before, after, parent_results, temp_voice_results, create_clones=(index == last_move)
+                )
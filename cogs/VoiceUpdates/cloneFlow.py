@@ -0,0 +1,173 @@
+import disnake
+import i18n
+import asyncio
+import logging
+import time
+from typing import Optional, TYPE_CHECKING
+
+from db.records import ParentVoice
+from utils.tracing import trace
+
+if TYPE_CHECKING:
+    from cogs.VoiceUpdates.voiceUpdates import VoiceUpdates
+
+logger = logging.getLogger(__name__)
+
+# States of a clone flow, the ones before DONE are persisted in clone_intents
+INTENT = "intent"           # serial number is reserved, the channel is not created yet
+CREATED = "created"         # the channel exists, permissions are not copied yet
+CONFIGURED = "configured"   # permissions are copied
+MOVING = "moving"           # the temporary voice is registered and the member is being moved
+DONE = "done"
+ROLLED_BACK = "rolled_back"
+
+def clone_name(name_template: str, member: disnake.Member, serial: int) -> str:
+    """Fill a parent voice's name template for a member's clone."""
+    return (
+        name_template
+        .replace("{user}", member.nick or member.global_name or member.name)
+        .replace("{serial}", str(serial))
+    )
+
+class CloneCancelled(Exception):
+    """Raised inside a clone flow once the member is known to have left the parent voice."""
+
+class CloneFlow:
+    """
+    Creation of a single clone, run as a state machine whose progress is persisted as a clone intent.
+    A newer voice event of the member cancels the flow, which then rolls back everything done so far.
+    """
+
+    def __init__(self, cog: "VoiceUpdates", member: disnake.Member, parent_channel: disnake.VoiceChannel, parent_result: ParentVoice):
+        self.cog = cog
+        self.member = member
+        self.parent_channel = parent_channel
+        self.parent_result = parent_result
+
+        self.state = INTENT
+        self.intent_id: Optional[int] = None
+        self.serial: Optional[int] = None
+        self.channel: Optional[disnake.VoiceChannel] = None
+        self.registered = False
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        """Request the flow to stop at its next step and roll back."""
+        self.cancelled = True
+
+    def is_expected_channel(self, channel: Optional[disnake.abc.Snowflake]) -> bool:
+        """Check if a member being in this channel is consistent with the flow (in the parent, or already in the clone)."""
+        if (channel is None):
+            return False
+        return channel.id == self.parent_channel.id or (self.channel is not None and channel.id == self.channel.id)
+
+    def check_cancelled(self) -> None:
+        if (self.cancelled):
+            raise CloneCancelled()
+
+    def set_state(self, state: str, channel_id: Optional[int] = None) -> None:
+        self.state = state
+        self.cog.db.update_clone_intent(self.intent_id, state, channel_id)
+
+    async def run(self) -> bool:
+        """Run the flow, rolling it back if it was cancelled or any step failed. Returns True if the clone was created."""
+        try:
+            await self.execute()
+            return True
+        except CloneCancelled:
+            await self.rollback()
+        except disnake.HTTPException as e:
+            logger.warning(
+                "Error creating clone: %s", e,
+                extra={"parent_voice_id": self.parent_channel.id, "member_id": self.member.id, "state": self.state}
+            )
+            await self.rollback()
+        except Exception:
+            # A failed database write must not leave the member in an unregistered clone either
+            logger.exception(
+                "Unexpected error creating clone",
+                extra={"parent_voice_id": self.parent_channel.id, "member_id": self.member.id, "state": self.state}
+            )
+            await self.rollback()
+        return False
+
+    async def execute(self) -> None:
+        db = self.cog.db
+        parent_channel = self.parent_channel
+        guild = parent_channel.guild
+
+        # Persist the intent first, so a crash at any later step leaves a record to clean up after
+        self.serial = db.get_next_serial_number(parent_channel.id)
+        self.intent_id = db.add_clone_intent(self.member.id, parent_channel.id, guild.id, self.serial, INTENT, time.time())
+
+        name = clone_name(self.parent_result.name_template, self.member, self.serial)
+
+        # Parent's permission overwrites don't depend on the clone, so they are fetched while it is being created
+        overwrites_task = asyncio.ensure_future(self.cog.fetch_permission_overwrites(parent_channel.id))
+        try:
+            with trace("rest.create_voice_channel", parent_voice_id=parent_channel.id) as span:
+                self.channel = await guild.create_voice_channel(
+                    name=name,
+                    category=parent_channel.category,
+                    bitrate=parent_channel.bitrate,
+                    user_limit=parent_channel.user_limit,
+                    rtc_region=parent_channel.rtc_region,
+                    video_quality_mode=parent_channel.video_quality_mode,
+                    nsfw=parent_channel.nsfw,
+                    slowmode_delay=parent_channel.slowmode_delay,
+                    overwrites=parent_channel.overwrites
+                )
+                span.set(channel_id=self.channel.id)
+        except BaseException:
+            overwrites_task.cancel()
+            raise
+        self.set_state(CREATED, self.channel.id)
+
+        # A workaround to disnake's lacking permissions inside overwrites
+        overwrites = await overwrites_task
+        self.check_cancelled()
+        if (overwrites is not None):
+            await self.cog.apply_permission_overwrites(self.channel.id, overwrites)
+        self.set_state(CONFIGURED)
+        self.check_cancelled()
+
+        # The temporary voice is registered before the move, so the member's voice events in the clone already find it
+        self.state = MOVING
+        db.register_clone_intent(self.intent_id, MOVING, self.channel.id)
+        self.registered = True
+        await self.move_member()
+
+        db.delete_clone_intent(self.intent_id)
+        self.state = DONE
+        self.cog.record_session_event(self.channel.id, parent_channel.id, guild.id, "create")
+        self.cog.join_throttle.set_last_clone(self.member.id, parent_channel.id, self.channel.id)
+
+    async def move_member(self) -> None:
+        with trace("rest.move_member", channel_id=self.channel.id):
+            await self.member.move_to(self.channel)
+
+    async def rollback(self) -> None:
+        """Delete the clone and its records created so far."""
+        self.state = ROLLED_BACK
+        if (self.intent_id is None):
+            return
+
+        db = self.cog.db
+        if (self.channel is not None and len(self.channel.members) > 0):
+            # Someone else has already joined the clone, so it is kept and deleted once it is empty
+            if (not self.registered):
+                db.register_clone_intent(self.intent_id, MOVING, self.channel.id)
+            db.delete_clone_intent(self.intent_id)
+            self.cog.record_session_event(self.channel.id, self.parent_channel.id, self.parent_channel.guild.id, "create")
+            return
+
+        db.delete_clone_intent(self.intent_id, rollback=True)
+        if (self.channel is None):
+            return
+        try:
+            with trace("rest.delete_channel", channel_id=self.channel.id):
+                await self.channel.delete(reason=i18n.t("voice_updates.clone_cancelled"))
+        except disnake.NotFound:
+            pass  # Channel was already deleted
+        except disnake.HTTPException as e:
+            logger.warning("Error deleting rolled back clone: %s", e, extra={"channel_id": self.channel.id})
@@ -0,0 +1,106 @@
+import disnake
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+
+from utils.tracing import trace
+
+if TYPE_CHECKING:
+    from cogs.VoiceUpdates.voiceUpdates import VoiceUpdates
+
+logger = logging.getLogger(__name__)
+
+class ClonePositions:
+    """
+    Keeps clones sorted by serial number right below their parent voice. The order of a guild's channels is
+    computed from the cache and applied with a single bulk positions request. The request is debounced:
+    it is sent once a guild has had no new clones for delay seconds, or max_delay seconds after the first
+    one of a burst that doesn't calm down.
+    """
+
+    def __init__(self, cog: "VoiceUpdates", delay: float = 2.0, max_delay: float = 60.0):
+        self.cog = cog
+        self.delay = delay
+        self.max_delay = max_delay
+
+        # Pending reorders: guild_id: (timer, loop time of the first request of the burst)
+        self.scheduled: Dict[int, Tuple[asyncio.TimerHandle, float]] = {}
+        # Keeps references to running reorders, so they are not garbage collected
+        self.tasks = set()
+
+    def schedule(self, guild_id: int) -> None:
+        """Reorder the guild's channels once the current burst is over, postponing a reorder that is already scheduled."""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        first_request = now
+        if (guild_id in self.scheduled):
+            handle, first_request = self.scheduled[guild_id]
+            handle.cancel()
+        when = min(now + self.delay, first_request + self.max_delay)
+        self.scheduled[guild_id] = (loop.call_at(when, self.start, guild_id), first_request)
+
+    def start(self, guild_id: int) -> None:
+        del self.scheduled[guild_id]
+        task = asyncio.get_running_loop().create_task(self.apply(guild_id))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    def close(self) -> None:
+        for handle, _ in self.scheduled.values():
+            handle.cancel()
+        self.scheduled.clear()
+
+    def compute(self, guild: disnake.Guild) -> List[dict]:
+        """Returns position changes that put every clone right below its parent, ordered by serial number."""
+        changes = []
+        voice_channels: Dict[Optional[int], List[disnake.abc.GuildChannel]] = {}
+        for channel in guild.voice_channels:
+            voice_channels.setdefault(channel.category_id, []).append(channel)
+
+        for channels in voice_channels.values():
+            channels.sort(key=lambda channel: (channel.position, channel.id))
+            ids = [channel.id for channel in channels]
+            temp_voices = self.cog.db.get_temporary_voices(ids)
+            parent_ids = {temp_voice.parent_voice_id for temp_voice in temp_voices.values()}
+            parents = self.cog.db.get_parent_voices(list(parent_ids)) if parent_ids else {}
+
+            # Clones of parents in this category, the rest keep their place among other channels
+            clones: Dict[int, List[disnake.abc.GuildChannel]] = {}
+            for channel in channels:
+                temp_voice = temp_voices.get(channel.id)
+                if (temp_voice and temp_voice.parent_voice_id in parents and temp_voice.parent_voice_id in ids):
+                    clones.setdefault(temp_voice.parent_voice_id, []).append(channel)
+            sorted_clones = {channel.id for parent_clones in clones.values() for channel in parent_clones}
+
+            order = []
+            for channel in channels:
+                if (channel.id in sorted_clones):
+                    continue
+                order.append(channel)
+                parent_clones = clones.get(channel.id)
+                if (parent_clones):
+                    order.extend(sorted(parent_clones, key=lambda clone: temp_voices[clone.id].serial_number))
+
+            # Existing position values are reused, so channels of other types are not moved. Discord allows
+            # duplicate positions and orders ties by id, so tied values are spread to be strictly increasing
+            positions = []
+            for position in sorted(channel.position for channel in channels):
+                positions.append(max(position, positions[-1] + 1) if positions else position)
+            for channel, position in zip(order, positions):
+                if (channel.position != position):
+                    changes.append({"id": channel.id, "position": position})
+        return changes
+
+    async def apply(self, guild_id: int) -> None:
+        """Send the guild's position changes in one request."""
+        guild = self.cog.bot.get_guild(guild_id)
+        if (guild is None):
+            return
+        changes = self.compute(guild)
+        if (not changes):
+            return
+        try:
+            with trace("rest.bulk_channel_update", guild_id=guild_id, channels=len(changes)):
+                await self.cog.bot.http.bulk_channel_update(guild_id, changes)
+        except disnake.HTTPException as e:
+            logger.warning("Error sorting clones: %s", e, extra={"guild_id": guild_id})
@@ -1,17 +1,131 @@
 import disnake
-from disnake.ext import commands
+from disnake.ext import commands, tasks
 
 import disnake.http
 import i18n
 
 from main import CloneVoiceBot
 from db.db import Database
+from db.records import ParentVoice, TemporaryVoice
+from utils.throttle import JoinThrottle
+from utils.tracing import trace
+from cogs.VoiceUpdates.cloneFlow import CloneFlow, INTENT, MOVING, clone_name
+from cogs.VoiceUpdates.batcher import VoiceEventBatcher
+from cogs.VoiceUpdates.positions import ClonePositions
+from workers import jobs
+from workers.dispatcher import JobDispatcher
+from typing import Any, Dict, List, Optional, Tuple
 import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
 
 class VoiceUpdates(commands.Cog):
-    def __init__(self, bot: CloneVoiceBot, db: Database):
+    def __init__(
+        self,
+        bot: CloneVoiceBot,
+        db: Database,
+        join_throttle: JoinThrottle,
+        batch_window: Optional[float] = None,
+        dispatcher: Optional[JobDispatcher] = None,
+        sort_delay: Optional[float] = None
+    ):
         self.bot = bot
         self.db = db
+        self.join_throttle = join_throttle
+
+        # REST calls are made by this process unless they are sent to the worker pool
+        self.dispatcher = dispatcher
+        if (self.dispatcher):
+            self.dispatcher.add_result_handler(self.handle_job_result)
+
+        # Voice events are handled one by one unless a maximal batch window is given
+        self.batcher = VoiceEventBatcher(self, max_window=batch_window) if batch_window else None
+
+        # Clones are left where Discord puts them unless they are kept sorted below their parents
+        self.positions = ClonePositions(self, delay=sort_delay) if sort_delay is not None else None
+
+        # Clones that are being created: member_id: flow
+        self.clone_flows: Dict[int, CloneFlow] = {}
+        # Clones that the worker pool is creating: member_id: (job_id, parent_channel_id)
+        self.clone_jobs: Dict[int, Tuple[int, int]] = {}
+        # Intents created before this time are left over from a previous run, newer ones belong to running flows
+        self.started_at = time.time()
+        # Empty temporary voices whose records are deleted, but channels are not yet: channel_id: temporary voice
+        self.pending_deletions: Dict[int, TemporaryVoice] = {}
+        self.recovered = False
+
+        # Monotonic time of the last voice event, background maintenance waits for quiet periods
+        self.last_event_time = 0.0
+
+        # Session events waiting to be written: (channel_id, parent_voice_id, guild_id, event, timestamp)
+        self.pending_session_events = []
+        self.flush_task = self.flush_session_events.start()
+
+    def cog_unload(self):
+        self.flush_task.cancel()
+        self.write_session_events()
+        if (self.batcher):
+            self.batcher.close()
+        if (self.positions):
+            self.positions.close()
+
+    @tasks.loop(seconds=5)
+    async def flush_session_events(self):
+        """Regularly write buffered session events in one batch"""
+        try:
+            self.write_session_events()
+        except Exception:
+            # Any error would stop the loop for good, the events are written with the next batch instead
+            logger.exception("Error writing session events", extra={"events": len(self.pending_session_events)})
+
+    def write_session_events(self):
+        """Write all buffered session events to the database."""
+        if (not self.pending_session_events):
+            return
+        events, self.pending_session_events = self.pending_session_events, []
+        try:
+            self.db.add_voice_session_events(events)
+        except Exception:
+            # Kept ahead of the events buffered meanwhile, so they are written in order
+            self.pending_session_events[:0] = events
+            raise
+
+    def record_session_event(self, channel_id: int, parent_voice_id: int, guild_id: int, event: str):
+        """Buffer a clone creation or deletion event for the session log."""
+        self.pending_session_events.append((channel_id, parent_voice_id, guild_id, event, time.time()))
+
+    async def fetch_permission_overwrites(self, channel_id: int) -> Optional[list]:
+        """Get raw permission overwrites of a channel, None if they could not be fetched"""
+        get_route = disnake.http.Route(
+            'GET',
+            '/channels/{channel_id}',
+            channel_id=channel_id
+        )
+        try:
+            with trace("rest.get_channel", channel_id=channel_id):
+                channel_data = await self.bot.http.request(get_route)
+        except disnake.HTTPException as e:
+            logger.warning("Error fetching channel permissions: %s", e, extra={"channel_id": channel_id})
+            return None
+        return channel_data.get('permission_overwrites', [])
+
+    async def apply_permission_overwrites(self, channel_id: int, overwrites: list) -> bool:
+        """Replace all permission overwrites of a channel with raw ones"""
+        put_route = disnake.http.Route(
+            'PATCH',
+            '/channels/{channel_id}',
+            channel_id=channel_id
+        )
+        payload = {'permission_overwrites': overwrites}
+        try:
+            with trace("rest.edit_channel", channel_id=channel_id):
+                await self.bot.http.request(put_route, json=payload)
+        except disnake.HTTPException as e:
+            logger.warning("Error applying channel permissions: %s", e, extra={"channel_id": channel_id})
+            return False
+        return True
 
     async def copy_channel_permissions(
         self,
@@ -20,73 +134,260 @@ class VoiceUpdates(commands.Cog):
     ):
         """Copy all permission overwrites from one channel to another"""
         # 1. Get permissions from source channel
-        get_route = disnake.http.Route(
-            'GET',
-            '/channels/{channel_id}',
-            channel_id=source_channel_id
-        )
-        
+        overwrites = await self.fetch_permission_overwrites(source_channel_id)
+        if (overwrites is None):
+            return False
+
+        # 2. Apply to target channel
+        return await self.apply_permission_overwrites(target_channel_id, overwrites)
+
+    async def move_to_existing_clone(self, member: disnake.Member, before: disnake.VoiceState, parent_id: int) -> Optional[int]:
+        """
+        Move a throttled member back into their clone of the parent voice instead of creating a new one.
+        Returns id of that clone, None if the member was not moved.
+        """
+        clone_id = None
+        if (before.channel):
+            temp_voice_result = self.db.get_temporary_voice(before.channel.id)
+            if (temp_voice_result and temp_voice_result.parent_voice_id == parent_id):
+                clone_id = before.channel.id
+        if (clone_id is None):
+            clone_id = self.join_throttle.get_last_clone(member.id, parent_id)
+        if (clone_id is None):
+            return None
+
+        clone_channel = member.guild.get_channel(clone_id)
+        if (clone_channel is None or self.db.get_temporary_voice(clone_id) is None):
+            return None
+
+        if (self.dispatcher):
+            self.dispatcher.submit(jobs.move_job(member.guild.id, member.id, clone_id))
+            return clone_id
         try:
-            channel_data = await self.bot.http.request(get_route)
-            overwrites = channel_data.get('permission_overwrites', [])
-            
-            # 2. Apply to target channel
-            put_route = disnake.http.Route(
-                'PATCH',
-                '/channels/{channel_id}',
-                channel_id=target_channel_id
-            )
-            
-            payload = {'permission_overwrites': overwrites}
-            await self.bot.http.request(put_route, json=payload)
+            with trace("rest.move_member", channel_id=clone_id):
+                await member.move_to(clone_channel)
+        except disnake.HTTPException:
+            return None
+        return clone_id
+
+    async def create_clone(self, member: disnake.Member, parent_channel: disnake.VoiceChannel, parent_result: ParentVoice) -> bool:
+        """Create a temporary clone of the parent voice channel and move the member into it."""
+        if (self.dispatcher):
+            self.submit_clone(member, parent_channel, parent_result)
             return True
-        except disnake.HTTPException as e:
-            print(f"Error copying channel permissions: {e}")
-            return False
+        flow = CloneFlow(self, member, parent_channel, parent_result)
+        self.clone_flows[member.id] = flow
+        try:
+            created = await flow.run()
+            if (created and self.positions):
+                self.positions.schedule(parent_channel.guild.id)
+            return created
+        finally:
+            if (self.clone_flows.get(member.id) is flow):
+                del self.clone_flows[member.id]
 
-    @commands.Cog.listener()
-    async def on_voice_state_update(self, member: disnake.Member, before: disnake.VoiceState, after: disnake.VoiceState):
-        if (after.channel):
-            parent_result = self.db.get_parent_voice(after.channel.id)
-            if (parent_result and before.channel != after.channel):
-                category = after.channel.category
+    def submit_clone(self, member: disnake.Member, parent_channel: disnake.VoiceChannel, parent_result: ParentVoice):
+        """Reserve a serial number for a clone and leave its creation to the worker pool."""
+        guild = parent_channel.guild
+        serial = self.db.get_next_serial_number(parent_channel.id)
+        intent_id = self.db.add_clone_intent(member.id, parent_channel.id, guild.id, serial, INTENT, time.time())
 
-                overwrites = after.channel.overwrites
+        # Cached overwrites are only used if the worker fails to fetch the raw ones
+        overwrites = []
+        for target, overwrite in parent_channel.overwrites.items():
+            allow, deny = overwrite.pair()
+            overwrites.append({
+                "id": str(target.id),
+                "type": 0 if isinstance(target, disnake.Role) else 1,
+                "allow": str(allow.value),
+                "deny": str(deny.value)
+            })
+        settings = {
+            "parent_id": str(parent_channel.category_id) if parent_channel.category_id else None,
+            "bitrate": parent_channel.bitrate,
+            "user_limit": parent_channel.user_limit,
+            "rtc_region": parent_channel.rtc_region,
+            "video_quality_mode": int(parent_channel.video_quality_mode),
+            "nsfw": parent_channel.nsfw,
+            "rate_limit_per_user": parent_channel.slowmode_delay,
+            "permission_overwrites": overwrites
+        }
+        job = jobs.clone_job(
+            guild.id,
+            parent_channel.id,
+            member.id,
+            intent_id,
+            clone_name(parent_result.name_template, member, serial),
+            settings,
+            cancel_reason=i18n.t("voice_updates.clone_cancelled")
+        )
+        self.clone_jobs[member.id] = (job["id"], parent_channel.id)
+        self.dispatcher.submit(job)
+
+    def handle_job_result(self, result: Dict[str, Any]):
+        """Book the outcome of a job executed by the worker pool."""
+        if (result["type"] == jobs.DELETE):
+            # Failed deletions are dropped as well, the channel is gone or can't be deleted by the bot
+            self.pending_deletions.pop(result["key"], None)
+            return
+        if (result["type"] != jobs.CLONE):
+            return
+        if (self.clone_jobs.get(result["member_id"], (None,))[0] == result["id"]):
+            del self.clone_jobs[result["member_id"]]
+        if (not result.get("ok")):
+            return
+        self.record_session_event(result["channel_id"], result["parent_channel_id"], result["guild_id"], "create")
+        self.join_throttle.set_last_clone(result["member_id"], result["parent_channel_id"], result["channel_id"])
+        if (self.positions):
+            self.positions.schedule(result["guild_id"])
 
-                template: str = parent_result["name_template"]
-                serial = self.db.get_next_serial_number(after.channel.id)
+    async def delete_empty_channel(self, channel: disnake.abc.GuildChannel, temp_voice_result: TemporaryVoice):
+        """Delete the channel of a temporary voice whose record is already deleted."""
+        self.pending_deletions[channel.id] = temp_voice_result
+        if (self.dispatcher):
+            self.dispatcher.submit(jobs.delete_job(channel.id, i18n.t("voice_updates.voice_is_empty")))
+            return
+        try:
+            with trace("rest.delete_channel", channel_id=channel.id):
+                await channel.delete(reason=i18n.t("voice_updates.voice_is_empty"))
+        finally:
+            self.pending_deletions.pop(channel.id, None)
 
-                name = template.replace("{user}", member.nick or member.global_name or member.name).replace("{serial}", str(serial))
+    async def resume_deletions(self, deletions: List[TemporaryVoice]):
+        """Finish deletions of empty temporary voices that were interrupted by a restart."""
+        for temp_voice in deletions:
+            channel = self.bot.get_channel(temp_voice.channel_id)
+            if (channel is None):
+                continue
+            if (len(channel.members) > 0):
+                # Members have joined before the channel was deleted, so it is tracked again until it is empty
+                self.db.add_temporary_voice(*temp_voice)
+                # Its deletion was already logged, so its creation is logged again to keep the stats balanced
+                self.record_session_event(temp_voice.channel_id, temp_voice.parent_voice_id, temp_voice.guild_id, "create")
+                continue
+            try:
+                await self.delete_empty_channel(channel, temp_voice)
+            except disnake.HTTPException as e:
+                logger.warning("Error deleting empty temporary voice: %s", e, extra={"channel_id": channel.id})
 
-                cloned_channel = await after.channel.guild.create_voice_channel(
-                    name=name,
-                    category=category,
-                    bitrate=after.channel.bitrate,
-                    user_limit=after.channel.user_limit,
-                    rtc_region=after.channel.rtc_region,
-                    video_quality_mode=after.channel.video_quality_mode,
-                    nsfw=after.channel.nsfw,
-                    slowmode_delay=after.channel.slowmode_delay,
-                    overwrites=overwrites
-                )
+    async def recover_clone_intents(self):
+        """Finish or roll back the clones whose creation was interrupted by a restart."""
+        for intent in list(self.db.get_all_clone_intents()):
+            if (intent.created_at >= self.started_at):
+                # Created by a flow of this process from a voice event that arrived before on_ready
+                continue
+            channel = self.bot.get_channel(intent.channel_id) if intent.channel_id else None
+            if (channel is not None and len(channel.members) > 0):
+                # Members are already inside, so the clone is adopted and deleted once it is empty
+                if (intent.state != MOVING):
+                    self.db.register_clone_intent(intent.id, MOVING, channel.id)
+                self.db.delete_clone_intent(intent.id)
+                self.record_session_event(channel.id, intent.parent_voice_id, intent.guild_id, "create")
+                continue
 
-                # A workaround to disnake's lacking permissions inside overwrites
-                await self.copy_channel_permissions(after.channel.id, cloned_channel.id)
+            self.db.delete_clone_intent(intent.id, rollback=True)
+            if (channel is None):
+                continue
+            try:
+                await channel.delete(reason=i18n.t("voice_updates.clone_cancelled"))
+            except disnake.HTTPException as e:
+                logger.warning("Error deleting interrupted clone: %s", e, extra={"channel_id": channel.id})
 
-                self.db.add_temporary_voice(cloned_channel.id, after.channel.id, after.channel.guild.id, serial)
+    @commands.Cog.listener()
+    async def on_ready(self):
+        if (self.recovered):
+            return
+        self.recovered = True
+        await self.recover_clone_intents()
+
+    @commands.Cog.listener()
+    async def on_voice_state_update(self, member: disnake.Member, before: disnake.VoiceState, after: disnake.VoiceState):
+        self.last_event_time = time.monotonic()
+        if (self.batcher):
+            self.batcher.submit(member, before, after)
+            return
+        with trace(
+            "voice_state_update",
+            guild_id=member.guild.id,
+            member_id=member.id,
+            before_channel_id=before.channel.id if before.channel else None,
+            after_channel_id=after.channel.id if after.channel else None
+        ):
+            await self.handle_voice_state_update(member, before, after)
 
-                await member.move_to(cloned_channel)
+    def cancel_stale_clone_flow(self, member: disnake.Member, after: disnake.VoiceState):
+        """Cancel the clone being created for a member if the member is no longer where the clone flow expects."""
+        flow = self.clone_flows.get(member.id)
+        if (flow and not flow.is_expected_channel(after.channel)):
+            # The member has left the parent before their clone was ready
+            flow.cancel()
+        clone_job = self.clone_jobs.get(member.id)
+        if (clone_job and (after.channel is None or after.channel.id != clone_job[1])):
+            # The worker checks for the cancellation before every step up to the move, so the member's
+            # own move into the finished clone doesn't affect it
+            del self.clone_jobs[member.id]
+            self.dispatcher.cancel(clone_job[0])
+
+    async def handle_voice_state_update(
+        self,
+        member: disnake.Member,
+        before: disnake.VoiceState,
+        after: disnake.VoiceState,
+        parent_results: Optional[Dict[int, ParentVoice]] = None,
+        temp_voice_results: Optional[Dict[int, TemporaryVoice]] = None,
+        create_clones: bool = True
+    ):
+        """
+        Create a clone when a member joins a parent voice and delete temporary voices that become empty.
+        Batched events pass parent and temporary voices looked up for the whole batch.
+        """
+        self.cancel_stale_clone_flow(member, after)
+
+        if (after.channel and create_clones):
+            if (parent_results is not None):
+                parent_result = parent_results.get(after.channel.id)
+            else:
+                parent_result = self.db.get_parent_voice(after.channel.id)
+            if (parent_result and before.channel != after.channel):
+                if (self.join_throttle.acquire(member.id, parent_result)):
+                    await self.create_clone(member, after.channel, parent_result)
+                else:
+                    # Too many clones were requested recently, so the member is sent to their existing clone
+                    clone_id = await self.move_to_existing_clone(member, before, after.channel.id)
+                    if (clone_id is not None and before.channel and clone_id == before.channel.id):
+                        # The member is back in the channel they left, so it is not empty
+                        return
         if (before.channel):
-            temp_voice_result = self.db.get_temporary_voice(before.channel.id)
+            if (temp_voice_results is not None):
+                temp_voice_result = temp_voice_results.get(before.channel.id)
+            else:
+                temp_voice_result = self.db.get_temporary_voice(before.channel.id)
             if (not temp_voice_result):
                 # Ignoring voice event completely
                 return
             if (len(before.channel.members) == 0):
-                self.db.delete_temporary_voice(before.channel.id)
-                await before.channel.delete(reason=i18n.t("voice_updates.voice_is_empty"))
+                if (not self.db.delete_temporary_voice(before.channel.id)):
+                    # Another event of the same channel has already deleted it
+                    return
+                self.record_session_event(
+                    before.channel.id,
+                    temp_voice_result.parent_voice_id,
+                    temp_voice_result.guild_id,
+                    "delete"
+                )
+                await self.delete_empty_channel(before.channel, temp_voice_result)
                 return
         
 
 def setup(bot: CloneVoiceBot):
-    from main import db
-    bot.add_cog(VoiceUpdates(bot, db))
+    from main import db, dispatcher, THROTTLE_USER_JOINS, THROTTLE_USER_PERIOD, THROTTLE_PARENT_JOINS, THROTTLE_PARENT_PERIOD, VOICE_BATCH_WINDOW_MS, SORT_CLONES, SORT_CLONES_DELAY
+    join_throttle = JoinThrottle(
+        user_joins=THROTTLE_USER_JOINS,
+        user_period=THROTTLE_USER_PERIOD,
+        parent_joins=THROTTLE_PARENT_JOINS,
+        parent_period=THROTTLE_PARENT_PERIOD
+    )
+    bot.add_cog(VoiceUpdates(
+        bot, db, join_throttle, batch_window=VOICE_BATCH_WINDOW_MS / 1000, dispatcher=dispatcher,
+        sort_delay=SORT_CLONES_DELAY if SORT_CLONES else None
+    ))
\ No newline at end of file
@@ -1,12 +1,35 @@
 import sqlite3
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple, Iterator
+
+from db.records import ParentVoice, TemporaryVoice, VoiceStats, HourlyVoiceStats, CloneIntent
+from utils.tracing import traced
+
+# SQLite limits the number of variables in a single query (999 in older versions)
+MAX_QUERY_VARIABLES = 900
 
 class Database:
     def __init__(self, db_path: str = 'voice_channels.db'):
         """Initialize the database connection and create tables if they don't exist."""
         self.db_path = db_path
         self.conn = sqlite3.connect(db_path)
+        self._configure_connection()
         self._create_tables()
+        self._migrate_tables()
+
+    def _configure_connection(self) -> None:
+        """
+        Switch the database to WAL journaling, so background maintenance and backups don't block the bot,
+        and to incremental auto vacuum, so freed pages can be returned in small steps.
+        """
+        if self.db_path == ':memory:':
+            return
+        auto_vacuum = self.conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        if auto_vacuum != 2: # INCREMENTAL
+            # Changing auto vacuum mode of an existing database requires a full VACUUM, done once on startup
+            self.conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            self.conn.execute("VACUUM")
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
 
     def _create_tables(self) -> None:
         """Create the necessary tables if they don't exist."""
@@ -16,7 +39,11 @@ class Database:
                 CREATE TABLE IF NOT EXISTS parent_voices (
                     channel_id BIGINT PRIMARY KEY,
                     guild_id BIGINT NOT NULL,
-                    name_template TEXT NOT NULL
+                    name_template TEXT NOT NULL,
+                    user_joins INTEGER,
+                    user_period REAL,
+                    parent_joins INTEGER,
+                    parent_period REAL
                 )
             """)
             
@@ -30,7 +57,108 @@ class Database:
                     FOREIGN KEY (parent_voice_id) REFERENCES parent_voices(channel_id)
                 )
             """)
+            self.conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_temporary_voices_parent
+                ON temporary_voices (parent_voice_id)
+            """)
+
+            # Create clone_intents table (clones that are being created, so they can be rolled back after a crash)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS clone_intents (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    member_id BIGINT NOT NULL,
+                    parent_voice_id BIGINT NOT NULL,
+                    guild_id BIGINT NOT NULL,
+                    serial_number BIGINT NOT NULL CHECK (serial_number > 0),
+                    state TEXT NOT NULL,
+                    channel_id BIGINT,
+                    created_at REAL NOT NULL
+                )
+            """)
+
+            # Create voice_session_events table (append-only log of clone creations and deletions)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS voice_session_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    channel_id BIGINT NOT NULL,
+                    parent_voice_id BIGINT NOT NULL,
+                    guild_id BIGINT NOT NULL,
+                    event TEXT NOT NULL CHECK (event IN ('create', 'delete')),
+                    timestamp REAL NOT NULL
+                )
+            """)
+            self.conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_voice_session_events_channel
+                ON voice_session_events (channel_id)
+            """)
+            self.conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_voice_session_events_timestamp
+                ON voice_session_events (timestamp)
+            """)
+
+            # Create voice_stats table (all-time aggregates per parent voice, maintained incrementally)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS voice_stats (
+                    parent_voice_id BIGINT PRIMARY KEY,
+                    guild_id BIGINT NOT NULL,
+                    clones_created BIGINT NOT NULL DEFAULT 0,
+                    clones_deleted BIGINT NOT NULL DEFAULT 0,
+                    total_lifetime REAL NOT NULL DEFAULT 0,
+                    active BIGINT NOT NULL DEFAULT 0,
+                    peak_concurrency BIGINT NOT NULL DEFAULT 0
+                )
+            """)
+
+            # Create voice_stats_hourly table (per parent voice and hour aggregates, maintained incrementally)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS voice_stats_hourly (
+                    parent_voice_id BIGINT NOT NULL,
+                    hour BIGINT NOT NULL,
+                    guild_id BIGINT NOT NULL,
+                    clones_created BIGINT NOT NULL DEFAULT 0,
+                    clones_deleted BIGINT NOT NULL DEFAULT 0,
+                    total_lifetime REAL NOT NULL DEFAULT 0,
+                    peak_concurrency BIGINT NOT NULL DEFAULT 0,
+                    PRIMARY KEY (parent_voice_id, hour)
+                )
+            """)
+
+            # Create meta table, its generation counts every change of parent and temporary voices,
+            # so state saved outside of the database can tell whether it is still up to date
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )
+            """)
+            self.conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('generation', 0)")
+            for table in ("parent_voices", "temporary_voices"):
+                for operation in ("INSERT", "UPDATE", "DELETE"):
+                    self.conn.execute(f"""
+                        CREATE TRIGGER IF NOT EXISTS trg_{table}_{operation.lower()}_generation
+                        AFTER {operation} ON {table}
+                        BEGIN
+                            UPDATE meta SET value = value + 1 WHERE key = 'generation';
+                        END
+                    """)
     
+    def _migrate_tables(self) -> None:
+        """Add the columns that were introduced after the tables had been created."""
+        parent_voice_columns = {
+            row[1] for row in self.conn.execute("PRAGMA table_info(parent_voices)")
+        }
+        with self.conn:
+            # Clone throttling limits (NULL means the bot-wide default is used)
+            for column, column_type in (
+                ("user_joins", "INTEGER"),
+                ("user_period", "REAL"),
+                ("parent_joins", "INTEGER"),
+                ("parent_period", "REAL"),
+            ):
+                if column not in parent_voice_columns:
+                    self.conn.execute(f"ALTER TABLE parent_voices ADD COLUMN {column} {column_type}")
+
+    @traced()
     def add_parent_voice(self, channel_id: int, guild_id: int, name_template: str) -> None:
         """Add a new parent voice channel to the database."""
         with self.conn:
@@ -39,6 +167,26 @@ class Database:
                 VALUES (?, ?, ?)
             """, (channel_id, guild_id, name_template))
     
+    @traced()
+    def upsert_parent_voices(self, guild_id: int, parent_voices: List[Tuple[int, str, Optional[int], Optional[float], Optional[int], Optional[float]]]) -> None:
+        """
+        Add or update a batch of (channel_id, name_template, user_joins, user_period, parent_joins, parent_period)
+        parent voice channels of a guild in a single transaction.
+        """
+        with self.conn:
+            self.conn.executemany("""
+                INSERT INTO parent_voices (channel_id, guild_id, name_template, user_joins, user_period, parent_joins, parent_period)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (channel_id) DO UPDATE SET
+                    guild_id = excluded.guild_id,
+                    name_template = excluded.name_template,
+                    user_joins = excluded.user_joins,
+                    user_period = excluded.user_period,
+                    parent_joins = excluded.parent_joins,
+                    parent_period = excluded.parent_period
+            """, [(channel_id, guild_id, *rest) for channel_id, *rest in parent_voices])
+    
+    @traced()
     def add_temporary_voice(self, channel_id: int, parent_voice_id: int, guild_id: int, serial_number: int) -> None:
         """Add a new temporary voice channel to the database."""
         with self.conn:
@@ -47,6 +195,7 @@ class Database:
                 VALUES (?, ?, ?, ?)
             """, (channel_id, parent_voice_id, guild_id, serial_number))
 
+    @traced()
     def update_parent_voice(self, channel_id: int, guild_id: int, name_template: str) -> None:
         """Update the name template of an existing parent voice channel."""
         with self.conn:
@@ -56,6 +205,24 @@ class Database:
                 WHERE channel_id = ?
             """, (guild_id, name_template, channel_id))
     
+    @traced()
+    def update_parent_voice_throttle(
+        self,
+        channel_id: int,
+        user_joins: Optional[int],
+        user_period: Optional[float],
+        parent_joins: Optional[int],
+        parent_period: Optional[float]
+    ) -> None:
+        """Update the clone throttling limits of an existing parent voice channel."""
+        with self.conn:
+            self.conn.execute("""
+                UPDATE parent_voices
+                SET user_joins = ?, user_period = ?, parent_joins = ?, parent_period = ?
+                WHERE channel_id = ?
+            """, (user_joins, user_period, parent_joins, parent_period, channel_id))
+    
+    @traced()
     def update_temporary_voice(self, channel_id: int, parent_voice_id: int, guild_id: int, serial_number: int) -> None:
         """Update the parent_voice_id and serial_number of an existing temporary voice channel."""
         with self.conn:
@@ -65,6 +232,7 @@ class Database:
                 WHERE channel_id = ? AND guild_id = ?
             """, (guild_id, parent_voice_id, serial_number, channel_id))
     
+    @traced()
     def delete_parent_voice(self, channel_id: int) -> None:
         """Delete a parent voice channel from the database."""
         with self.conn:
@@ -73,51 +241,71 @@ class Database:
                 WHERE channel_id = ?
             """, (channel_id,))
     
-    def delete_temporary_voice(self, channel_id: int) -> None:
-        """Delete a temporary voice channel from the database."""
+    @traced()
+    def delete_parent_voice_cascade(self, channel_id: int, temporary_voice_ids: List[int]) -> None:
+        """Delete a parent voice channel together with the given temporary voices of it in a single transaction."""
         with self.conn:
+            self.conn.executemany("""
+                DELETE FROM temporary_voices
+                WHERE channel_id = ? AND parent_voice_id = ?
+            """, [(temporary_voice_id, channel_id) for temporary_voice_id in temporary_voice_ids])
             self.conn.execute("""
+                DELETE FROM parent_voices
+                WHERE channel_id = ?
+            """, (channel_id,))
+    
+    @traced()
+    def delete_temporary_voice(self, channel_id: int) -> bool:
+        """Delete a temporary voice channel from the database. Returns False if it was already deleted."""
+        with self.conn:
+            cursor = self.conn.execute("""
                 DELETE FROM temporary_voices
                 WHERE channel_id = ?
             """, (channel_id,))
+        return cursor.rowcount > 0
     
-    def get_parent_voice(self, channel_id: int) -> Optional[Dict[str, Any]]:
+    @traced()
+    def get_parent_voice(self, channel_id: int) -> Optional[ParentVoice]:
         """Get a parent voice channel by its ID."""
         cursor = self.conn.cursor()
         cursor.execute("""
-            SELECT channel_id, guild_id, name_template
+            SELECT channel_id, guild_id, name_template, user_joins, user_period, parent_joins, parent_period
             FROM parent_voices
             WHERE channel_id = ?
         """, (channel_id,))
         row = cursor.fetchone()
         if row:
-            return {
-                'channel_id': row[0],
-                'guild_id': row[1],
-                'name_template': row[2]
-            }
+            return ParentVoice._make(row)
         return None
     
-    def get_all_parent_voices_from_guild(self, guild_id: int) -> List[Dict[str, Any]]:
-        """Get all parent voice channels that are in a guild with specified ID."""
+    @traced()
+    def get_parent_voices(self, channel_ids: List[int]) -> Dict[int, ParentVoice]:
+        """Get all parent voice channels among the given IDs, with one query per MAX_QUERY_VARIABLES IDs."""
+        result = {}
+        for start in range(0, len(channel_ids), MAX_QUERY_VARIABLES):
+            chunk = channel_ids[start:start + MAX_QUERY_VARIABLES]
+            cursor = self.conn.execute(f"""
+                SELECT channel_id, guild_id, name_template, user_joins, user_period, parent_joins, parent_period
+                FROM parent_voices
+                WHERE channel_id IN ({", ".join("?" * len(chunk))})
+            """, chunk)
+            for row in cursor:
+                result[row[0]] = ParentVoice._make(row)
+        return result
+    
+    @traced()
+    def get_all_parent_voices_from_guild(self, guild_id: int) -> Iterator[ParentVoice]:
+        """Get all parent voice channels that are in a guild with specified ID. Rows are fetched lazily."""
         cursor = self.conn.cursor()
         cursor.execute("""
-            SELECT channel_id, guild_id, name_template
+            SELECT channel_id, guild_id, name_template, user_joins, user_period, parent_joins, parent_period
             FROM parent_voices
             WHERE guild_id = ?
         """, (guild_id,))
-        rows = cursor.fetchall()
-        result = [
-            {
-                'channel_id': row[0],
-                'guild_id': row[1],
-                'name_template': row[2]
-            }
-            for row in rows
-        ]
-        return result
+        return map(ParentVoice._make, cursor)
     
-    def get_temporary_voice(self, channel_id: int) -> Optional[Dict[str, Any]]:
+    @traced()
+    def get_temporary_voice(self, channel_id: int) -> Optional[TemporaryVoice]:
         """Get a temporary voice channel by its ID."""
         cursor = self.conn.cursor()
         cursor.execute("""
@@ -127,26 +315,53 @@ class Database:
         """, (channel_id,))
         row = cursor.fetchone()
         if row:
-            return {
-                'channel_id': row[0],
-                'parent_voice_id': row[1],
-                'guild_id': row[2],
-                'serial_number': row[3]
-            }
+            return TemporaryVoice._make(row)
         return None
     
+    @traced()
+    def get_temporary_voices(self, channel_ids: List[int]) -> Dict[int, TemporaryVoice]:
+        """Get all temporary voice channels among the given IDs, with one query per MAX_QUERY_VARIABLES IDs."""
+        result = {}
+        for start in range(0, len(channel_ids), MAX_QUERY_VARIABLES):
+            chunk = channel_ids[start:start + MAX_QUERY_VARIABLES]
+            cursor = self.conn.execute(f"""
+                SELECT channel_id, parent_voice_id, guild_id, serial_number
+                FROM temporary_voices
+                WHERE channel_id IN ({", ".join("?" * len(chunk))})
+            """, chunk)
+            for row in cursor:
+                result[row[0]] = TemporaryVoice._make(row)
+        return result
+    
+    @traced()
+    def get_temporary_voices_of_parent(self, parent_voice_id: int) -> Iterator[TemporaryVoice]:
+        """Get all temporary voice channels of a parent voice channel. Rows are fetched lazily."""
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT channel_id, parent_voice_id, guild_id, serial_number
+            FROM temporary_voices
+            WHERE parent_voice_id = ?
+        """, (parent_voice_id,))
+        return map(TemporaryVoice._make, cursor)
+    
+    @traced()
     def get_next_serial_number(self, parent_voice_id: int) -> int:
         """
         Get the minimum excluded value (MEX) among serial numbers for a given parent voice.
-        This is the smallest positive integer not currently used as a serial number.
+        This is the smallest positive integer not currently used as a serial number,
+        neither by a temporary voice nor by a clone that is still being created.
         """
         cursor = self.conn.cursor()
         cursor.execute("""
             SELECT serial_number
             FROM temporary_voices
             WHERE parent_voice_id = ?
+            UNION
+            SELECT serial_number
+            FROM clone_intents
+            WHERE parent_voice_id = ?
             ORDER BY serial_number
-        """, (parent_voice_id,))
+        """, (parent_voice_id, parent_voice_id))
         
         serial_numbers = [row[0] for row in cursor.fetchall()]
         
@@ -166,6 +381,221 @@ class Database:
         # If no gaps found, return the next number after the highest
         return expected
     
+    @traced()
+    def add_clone_intent(self, member_id: int, parent_voice_id: int, guild_id: int, serial_number: int, state: str, created_at: float) -> int:
+        """Add an intent to create a clone, reserving its serial number. Returns ID of the intent."""
+        with self.conn:
+            cursor = self.conn.execute("""
+                INSERT INTO clone_intents (member_id, parent_voice_id, guild_id, serial_number, state, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (member_id, parent_voice_id, guild_id, serial_number, state, created_at))
+        return cursor.lastrowid
+
+    @traced()
+    def update_clone_intent(self, intent_id: int, state: str, channel_id: Optional[int] = None) -> None:
+        """Update the state of a clone intent and the ID of the channel created for it."""
+        with self.conn:
+            self.conn.execute("""
+                UPDATE clone_intents
+                SET state = ?, channel_id = COALESCE(?, channel_id)
+                WHERE id = ?
+            """, (state, channel_id, intent_id))
+
+    @traced()
+    def register_clone_intent(self, intent_id: int, state: str, channel_id: int) -> None:
+        """Add the temporary voice of a clone intent and update the intent's state in a single transaction."""
+        with self.conn:
+            self.conn.execute("""
+                INSERT INTO temporary_voices (channel_id, parent_voice_id, guild_id, serial_number)
+                SELECT ?, parent_voice_id, guild_id, serial_number
+                FROM clone_intents
+                WHERE id = ?
+            """, (channel_id, intent_id))
+            self.conn.execute("""
+                UPDATE clone_intents
+                SET state = ?, channel_id = ?
+                WHERE id = ?
+            """, (state, channel_id, intent_id))
+
+    @traced()
+    def delete_clone_intent(self, intent_id: int, rollback: bool = False) -> None:
+        """
+        Delete a finished clone intent.
+        With rollback, the temporary voice registered for it is deleted in the same transaction as well.
+        """
+        with self.conn:
+            if rollback:
+                self.conn.execute("""
+                    DELETE FROM temporary_voices
+                    WHERE channel_id = (SELECT channel_id FROM clone_intents WHERE id = ?)
+                """, (intent_id,))
+            self.conn.execute("""
+                DELETE FROM clone_intents
+                WHERE id = ?
+            """, (intent_id,))
+
+    @traced()
+    def get_all_clone_intents(self) -> Iterator[CloneIntent]:
+        """Get all clone intents that have not finished yet. Rows are fetched lazily."""
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT id, member_id, parent_voice_id, guild_id, serial_number, state, channel_id, created_at
+            FROM clone_intents
+            ORDER BY id
+        """)
+        return map(CloneIntent._make, cursor)
+
+    @traced()
+    def add_voice_session_events(self, events: List[Tuple[int, int, int, str, float]]) -> None:
+        """
+        Append a batch of (channel_id, parent_voice_id, guild_id, event, timestamp) session events
+        and fold them into the per-parent and per-parent/hour aggregates in a single transaction.
+        """
+        if not events:
+            return
+
+        with self.conn:
+            self.conn.executemany("""
+                INSERT INTO voice_session_events (channel_id, parent_voice_id, guild_id, event, timestamp)
+                VALUES (?, ?, ?, ?, ?)
+            """, events)
+
+            # parent_voice_id: [guild_id, created, deleted, lifetime, active, peak]
+            totals: Dict[int, List[Any]] = {}
+            # (parent_voice_id, hour): [guild_id, created, deleted, lifetime, peak]
+            hourly: Dict[Tuple[int, int], List[Any]] = {}
+
+            for channel_id, parent_voice_id, guild_id, event, timestamp in events:
+                total = totals.get(parent_voice_id)
+                if total is None:
+                    row = self.conn.execute("""
+                        SELECT active
+                        FROM voice_stats
+                        WHERE parent_voice_id = ?
+                    """, (parent_voice_id,)).fetchone()
+                    active = row[0] if row else 0
+                    total = totals[parent_voice_id] = [guild_id, 0, 0, 0.0, active, 0]
+
+                hour = int(timestamp // 3600) * 3600
+                bucket = hourly.get((parent_voice_id, hour))
+                if bucket is None:
+                    bucket = hourly[(parent_voice_id, hour)] = [guild_id, 0, 0, 0.0, 0]
+
+                if event == "create":
+                    total[1] += 1
+                    bucket[1] += 1
+                    total[4] += 1
+                else:
+                    lifetime = self._get_session_lifetime(channel_id, timestamp)
+                    total[2] += 1
+                    total[3] += lifetime
+                    bucket[2] += 1
+                    bucket[3] += lifetime
+                    total[4] = max(total[4] - 1, 0)
+
+                total[5] = max(total[5], total[4])
+                bucket[4] = max(bucket[4], total[4])
+
+            self.conn.executemany("""
+                INSERT INTO voice_stats (parent_voice_id, guild_id, clones_created, clones_deleted, total_lifetime, active, peak_concurrency)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (parent_voice_id) DO UPDATE SET
+                    clones_created = clones_created + excluded.clones_created,
+                    clones_deleted = clones_deleted + excluded.clones_deleted,
+                    total_lifetime = total_lifetime + excluded.total_lifetime,
+                    active = excluded.active,
+                    peak_concurrency = MAX(peak_concurrency, excluded.peak_concurrency)
+            """, [(parent_voice_id, *total) for parent_voice_id, total in totals.items()])
+
+            self.conn.executemany("""
+                INSERT INTO voice_stats_hourly (parent_voice_id, hour, guild_id, clones_created, clones_deleted, total_lifetime, peak_concurrency)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (parent_voice_id, hour) DO UPDATE SET
+                    clones_created = clones_created + excluded.clones_created,
+                    clones_deleted = clones_deleted + excluded.clones_deleted,
+                    total_lifetime = total_lifetime + excluded.total_lifetime,
+                    peak_concurrency = MAX(peak_concurrency, excluded.peak_concurrency)
+            """, [(parent_voice_id, hour, *bucket) for (parent_voice_id, hour), bucket in hourly.items()])
+
+    def _get_session_lifetime(self, channel_id: int, deleted_at: float) -> float:
+        """Get the lifetime in seconds of a temporary voice channel from its logged creation event."""
+        row = self.conn.execute("""
+            SELECT timestamp
+            FROM voice_session_events
+            WHERE channel_id = ? AND event = 'create'
+            ORDER BY timestamp DESC
+            LIMIT 1
+        """, (channel_id,)).fetchone()
+        if row:
+            return max(deleted_at - row[0], 0.0)
+        return 0.0
+
+    @traced()
+    def get_voice_stats(self, parent_voice_id: int) -> Optional[VoiceStats]:
+        """Get the all-time aggregates of a parent voice channel."""
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT parent_voice_id, guild_id, clones_created, clones_deleted, total_lifetime, active, peak_concurrency
+            FROM voice_stats
+            WHERE parent_voice_id = ?
+        """, (parent_voice_id,))
+        row = cursor.fetchone()
+        if row:
+            return VoiceStats._make(row)
+        return None
+
+    @traced()
+    def get_hourly_voice_stats(self, parent_voice_id: int, hour: int) -> Optional[HourlyVoiceStats]:
+        """Get the aggregates of a parent voice channel for the hour starting at the given unix timestamp."""
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT parent_voice_id, hour, guild_id, clones_created, clones_deleted, total_lifetime, peak_concurrency
+            FROM voice_stats_hourly
+            WHERE parent_voice_id = ? AND hour = ?
+        """, (parent_voice_id, hour))
+        row = cursor.fetchone()
+        if row:
+            return HourlyVoiceStats._make(row)
+        return None
+
+    @traced()
+    def prune_voice_session_events(self, before: float) -> int:
+        """
+        Delete raw session events older than the given unix timestamp, since they are already
+        rolled up into the aggregates. Creation events of still existing temporary voices are kept,
+        so their lifetime can be computed once they are deleted. Returns the number of deleted events.
+        """
+        with self.conn:
+            cursor = self.conn.execute("""
+                DELETE FROM voice_session_events
+                WHERE timestamp < ?
+                AND NOT (
+                    event = 'create'
+                    AND channel_id IN (SELECT channel_id FROM temporary_voices)
+                )
+            """, (before,))
+        return cursor.rowcount
+    
+    @traced()
+    def get_generation(self) -> int:
+        """Get the number of changes made to parent and temporary voices so far."""
+        cursor = self.conn.execute("SELECT value FROM meta WHERE key = 'generation'")
+        return cursor.fetchone()[0]
+
+    def get_connection_stats(self) -> Dict[str, Any]:
+        """Get statistics of the database connection and file."""
+        page_count = self.conn.execute("PRAGMA page_count").fetchone()[0]
+        page_size = self.conn.execute("PRAGMA page_size").fetchone()[0]
+        freelist_count = self.conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return {
+            'total_changes': self.conn.total_changes,
+            'in_transaction': self.conn.in_transaction,
+            'page_count': page_count,
+            'page_size': page_size,
+            'freelist_count': freelist_count,
+            'size': page_count * page_size
+        }
+    
     def close(self) -> None:
         """Close the database connection."""
         self.conn.close()
@@ -0,0 +1,122 @@
+import sqlite3
+import os
+import time
+from typing import Any, Dict, Optional
+
+class DatabaseMaintenance:
+    """
+    Maintenance operations of the SQLite database: incremental vacuum, statistics, WAL checkpoints and online backups.
+    Every operation opens its own connection, so they can run on a worker thread while the bot keeps using its one.
+    Write locks are only held for small steps, and the bot's connection waits for them instead of failing.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        backup_path: Optional[str] = None,
+        vacuum_pages: int = 256,
+        backup_pages: int = 64,
+        step_sleep: float = 0.05
+    ):
+        self.db_path = db_path
+        self.backup_path = backup_path
+        self.vacuum_pages = vacuum_pages
+        self.backup_pages = backup_pages
+        self.step_sleep = step_sleep
+
+    def connect(self) -> sqlite3.Connection:
+        # Autocommit mode, so every step releases its lock as soon as it is done
+        return sqlite3.connect(self.db_path, timeout=1, isolation_level=None)
+
+    def get_size(self) -> int:
+        """Returns the size in bytes of the database file together with its WAL."""
+        size = 0
+        for path in (self.db_path, self.db_path + "-wal"):
+            if os.path.exists(path):
+                size += os.path.getsize(path)
+        return size
+
+    def incremental_vacuum(self) -> Dict[str, Any]:
+        """Return free pages to the file system in steps of vacuum_pages."""
+        started = time.perf_counter()
+        size_before = self.get_size()
+        conn = self.connect()
+        try:
+            freed = 0
+            while True:
+                free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                if free_pages == 0:
+                    break
+                step = min(free_pages, self.vacuum_pages)
+                # executescript steps the pragma to completion, execute would free a single page only
+                conn.executescript(f"PRAGMA incremental_vacuum({step});")
+                freed += step
+                time.sleep(self.step_sleep)
+        finally:
+            conn.close()
+        return {
+            "operation": "incremental_vacuum",
+            "duration": time.perf_counter() - started,
+            "freed_pages": freed,
+            "size_before": size_before,
+            "size_after": self.get_size(),
+        }
+
+    def optimize(self, analyze: bool = False) -> Dict[str, Any]:
+        """Refresh query planner statistics, fully with ANALYZE or only where needed with PRAGMA optimize."""
+        started = time.perf_counter()
+        conn = self.connect()
+        try:
+            if analyze:
+                conn.execute("ANALYZE")
+            else:
+                conn.execute("PRAGMA analysis_limit = 400")
+                conn.execute("PRAGMA optimize")
+        finally:
+            conn.close()
+        return {
+            "operation": "analyze" if analyze else "optimize",
+            "duration": time.perf_counter() - started,
+            "size_after": self.get_size(),
+        }
+
+    def checkpoint(self) -> Dict[str, Any]:
+        """Copy WAL contents back into the database file without waiting for readers or writers."""
+        started = time.perf_counter()
+        size_before = self.get_size()
+        conn = self.connect()
+        try:
+            busy, wal_pages, checkpointed_pages = conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+        finally:
+            conn.close()
+        return {
+            "operation": "checkpoint",
+            "duration": time.perf_counter() - started,
+            "busy": bool(busy),
+            "wal_pages": wal_pages,
+            "checkpointed_pages": checkpointed_pages,
+            "size_before": size_before,
+            "size_after": self.get_size(),
+        }
+
+    def backup(self) -> Dict[str, Any]:
+        """
+        Take a consistent copy of the database with the sqlite3 backup API, backup_pages pages per step.
+        The copy is written next to the target and moved into place once it is complete.
+        """
+        started = time.perf_counter()
+        temporary_path = self.backup_path + ".tmp"
+        source = self.connect()
+        target = sqlite3.connect(temporary_path)
+        try:
+            source.backup(target, pages=self.backup_pages, sleep=self.step_sleep)
+        finally:
+            target.close()
+            source.close()
+        os.replace(temporary_path, self.backup_path)
+        return {
+            "operation": "backup",
+            "duration": time.perf_counter() - started,
+            "path": self.backup_path,
+            "size_after": os.path.getsize(self.backup_path),
+        }
@@ -0,0 +1,52 @@
+from typing import NamedTuple, Optional
+
+# Rows are returned as named tuples: they have attribute access like regular classes,
+# but no per-instance __dict__, so large lists and caches of them stay small.
+
+class ParentVoice(NamedTuple):
+    """A row of the parent_voices table."""
+    channel_id: int
+    guild_id: int
+    name_template: str
+    user_joins: Optional[int]
+    user_period: Optional[float]
+    parent_joins: Optional[int]
+    parent_period: Optional[float]
+
+class TemporaryVoice(NamedTuple):
+    """A row of the temporary_voices table."""
+    channel_id: int
+    parent_voice_id: int
+    guild_id: int
+    serial_number: int
+
+class CloneIntent(NamedTuple):
+    """A row of the clone_intents table."""
+    id: int
+    member_id: int
+    parent_voice_id: int
+    guild_id: int
+    serial_number: int
+    state: str
+    channel_id: Optional[int]
+    created_at: float
+
+class VoiceStats(NamedTuple):
+    """A row of the voice_stats table."""
+    parent_voice_id: int
+    guild_id: int
+    clones_created: int
+    clones_deleted: int
+    total_lifetime: float
+    active: int
+    peak_concurrency: int
+
+class HourlyVoiceStats(NamedTuple):
+    """A row of the voice_stats_hourly table."""
+    parent_voice_id: int
+    hour: int
+    guild_id: int
+    clones_created: int
+    clones_deleted: int
+    total_lifetime: float
+    peak_concurrency: int
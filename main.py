@@ -1,6 +1,7 @@
 import disnake
 from disnake.ext import commands
 import asyncio
+import logging
 import os
 
 from dotenv import load_dotenv
@@ -8,17 +9,51 @@ from dotenv import load_dotenv
 from db.db import Database
 
 from _i18n.config import setup_i18n
+from utils.log import setup_logging, shutdown_logging
+from utils.tracing import set_trace_sample_rate
+from utils.watchdog import LoopWatchdog
+from workers.dispatcher import JobDispatcher
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 TOKEN = os.getenv("DISCORD_TOKEN")
 DB_URL = os.getenv("DB_URL")
 DEFAULT_LOCALE = os.getenv("DEFAULT_LOCALE")
 GUILD_ID = int(os.getenv("GUILD_ID"))
+VOICE_STATS_RETENTION_DAYS = float(os.getenv("VOICE_STATS_RETENTION_DAYS", "30"))
+# Default clone throttling limits, parent voices may override them
+THROTTLE_USER_JOINS = int(os.getenv("THROTTLE_USER_JOINS", "3"))
+THROTTLE_USER_PERIOD = float(os.getenv("THROTTLE_USER_PERIOD", "60"))
+THROTTLE_PARENT_JOINS = int(os.getenv("THROTTLE_PARENT_JOINS", "10"))
+THROTTLE_PARENT_PERIOD = float(os.getenv("THROTTLE_PARENT_PERIOD", "10"))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1"))
+TRACE_PATH = os.getenv("TRACE_PATH")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1"))
+WATCHDOG_SLOW_CALLBACK = float(os.getenv("WATCHDOG_SLOW_CALLBACK", "0.25"))
+DB_BACKUP_PATH = os.getenv("DB_BACKUP_PATH")
+DB_BACKUP_INTERVAL_HOURS = float(os.getenv("DB_BACKUP_INTERVAL_HOURS", "24"))
+MAINTENANCE_QUIET_SECONDS = float(os.getenv("MAINTENANCE_QUIET_SECONDS", "60"))
+VOICE_BATCH_WINDOW_MS = float(os.getenv("VOICE_BATCH_WINDOW_MS", "0"))
+# "single" makes every REST call from this process, "split" sends them to a pool of REST worker processes
+BOT_MODE = os.getenv("BOT_MODE", "single")
+REST_WORKERS = int(os.getenv("REST_WORKERS", "2"))
+SORT_CLONES = os.getenv("SORT_CLONES", "false").lower() == "true"
+SORT_CLONES_DELAY = float(os.getenv("SORT_CLONES_DELAY", "2"))
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH")
+SNAPSHOT_INTERVAL_SECONDS = float(os.getenv("SNAPSHOT_INTERVAL_SECONDS", "60"))
+
+setup_logging(level = LOG_LEVEL, sample_rate = LOG_SAMPLE_RATE, trace_path = TRACE_PATH)
+set_trace_sample_rate(TRACE_SAMPLE_RATE)
 
 setup_i18n(default_locale = DEFAULT_LOCALE)
 
 db = Database(DB_URL)
 
+# Worker processes are spawned by main(), not on import, since they import this module again
+dispatcher = JobDispatcher(TOKEN, DB_URL, workers = REST_WORKERS, log_level = LOG_LEVEL) if BOT_MODE == "split" else None
+
 class CloneVoiceBot(commands.InteractionBot):
     def __init__(self):
         intents = disnake.Intents.default()
@@ -27,15 +62,22 @@ class CloneVoiceBot(commands.InteractionBot):
         self.help_command_color = disnake.Color.blurple()
         self.registration_embed_color = disnake.Color.purple()
 
+        self.watchdog = LoopWatchdog(slow_callback=WATCHDOG_SLOW_CALLBACK)
+
         self.load_all_cogs()
 
     async def on_ready(self):
-        print(f"Bot is online as {self.user}")
+        logger.info(f"Bot is online as {self.user}")
 
     def load_all_cogs(self):
         self.load_extension("cogs.Help.help")
         self.load_extension("cogs.Registration.registration")
         self.load_extension("cogs.VoiceUpdates.voiceUpdates")
+        self.load_extension("cogs.Stats.stats")
+        self.load_extension("cogs.Debug.debug")
+        self.load_extension("cogs.Maintenance.maintenance")
+        # Restores the state of the cogs above, so it is loaded last
+        self.load_extension("cogs.Snapshot.snapshot")
     
     def check_guild(self, guild_id: int):
         return (guild_id == GUILD_ID) # Ignore all interactions that are not from whitelisted guild
@@ -53,7 +95,29 @@ class CloneVoiceBot(commands.InteractionBot):
 
 async def main():
     bot = CloneVoiceBot()
-    await bot.start(TOKEN)
+    bot.watchdog.start()
+    if (dispatcher):
+        dispatcher.start()
+    try:
+        await bot.start(TOKEN)
+    finally:
+        if (dispatcher):
+            await dispatcher.stop()
+        voice_updates = bot.get_cog("VoiceUpdates")
+        if (voice_updates):
+            # Buffered session events keep voice_stats.active consistent, so they are written before exiting
+            try:
+                voice_updates.write_session_events()
+            except Exception:
+                logger.exception("Error writing session events on shutdown")
+        snapshot = bot.get_cog("Snapshot")
+        if (snapshot):
+            try:
+                snapshot.save()
+            except Exception:
+                logger.exception("Error saving snapshot on shutdown")
+        bot.watchdog.stop()
+        shutdown_logging()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,250 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+disnake = pytest.importorskip("disnake")
+
+from cogs.VoiceUpdates.cloneFlow import CloneFlow, CREATED, CONFIGURED, DONE, INTENT, ROLLED_BACK
+from db.db import Database
+from db.records import ParentVoice
+
+GUILD_ID = 1
+PARENT_ID = 10
+MEMBER_ID = 100
+CLONE_ID = 1000
+
+def http_error() -> Exception:
+    return disnake.HTTPException(SimpleNamespace(status=400, reason="Bad Request"), {"code": 40032, "message": "Target user is not connected to voice."})
+
+class FakeDiscord:
+    """
+    Stands in for the REST calls a clone flow makes. Every call sleeps for its injected delay,
+    and a hook may run when a call starts, e.g. to cancel the flow while the request is in flight.
+    """
+
+    def __init__(self, **delays: float):
+        self.delays = delays
+        self.hooks = {}
+        self.errors = {}
+        self.calls = []
+
+    async def call(self, name: str):
+        self.calls.append(name)
+        if (name in self.hooks):
+            self.hooks[name]()
+        await asyncio.sleep(self.delays.get(name, 0))
+        if (name in self.errors):
+            raise self.errors[name]
+
+class FakeChannel:
+    def __init__(self, discord: FakeDiscord, channel_id: int):
+        self.discord = discord
+        self.id = channel_id
+        self.members = []
+        self.deleted = False
+
+    async def delete(self, reason=None):
+        await self.discord.call("delete")
+        self.deleted = True
+
+class FakeGuild:
+    def __init__(self, discord: FakeDiscord):
+        self.discord = discord
+        self.id = GUILD_ID
+        self.created = []
+
+    async def create_voice_channel(self, **options):
+        await self.discord.call("create")
+        channel = FakeChannel(self.discord, CLONE_ID + len(self.created))
+        self.created.append(channel)
+        return channel
+
+class FakeMember:
+    def __init__(self, discord: FakeDiscord):
+        self.discord = discord
+        self.id = MEMBER_ID
+        self.nick = None
+        self.global_name = "Member"
+        self.name = "member"
+        self.channel = None
+
+    async def move_to(self, channel):
+        await self.discord.call("move")
+        self.channel = channel
+        channel.members.append(self)
+
+class FakeCog:
+    def __init__(self, discord: FakeDiscord, db: Database):
+        self.discord = discord
+        self.db = db
+        self.session_events = []
+        self.last_clones = {}
+        self.join_throttle = SimpleNamespace(set_last_clone=self.set_last_clone)
+
+    def set_last_clone(self, user_id: int, parent_id: int, clone_id: int):
+        self.last_clones[(user_id, parent_id)] = clone_id
+
+    def record_session_event(self, channel_id: int, parent_voice_id: int, guild_id: int, event: str):
+        self.session_events.append((channel_id, event))
+
+    async def fetch_permission_overwrites(self, channel_id: int):
+        await self.discord.call("fetch_overwrites")
+        return []
+
+    async def apply_permission_overwrites(self, channel_id: int, overwrites: list):
+        await self.discord.call("apply_overwrites")
+        return True
+
+def make_flow(**delays: float):
+    discord = FakeDiscord(**delays)
+    db = Database(":memory:")
+    db.add_parent_voice(PARENT_ID, GUILD_ID, "{user} #{serial}")
+    guild = FakeGuild(discord)
+    parent_channel = SimpleNamespace(
+        id=PARENT_ID,
+        guild=guild,
+        category=None,
+        bitrate=64000,
+        user_limit=0,
+        rtc_region=None,
+        video_quality_mode=None,
+        nsfw=False,
+        slowmode_delay=0,
+        overwrites={}
+    )
+    member = FakeMember(discord)
+    cog = FakeCog(discord, db)
+    flow = CloneFlow(cog, member, parent_channel, ParentVoice(PARENT_ID, GUILD_ID, "{user} #{serial}", None, None, None, None))
+    return flow, discord, db, guild, member, cog
+
+def intent_states(db: Database):
+    return [intent.state for intent in db.get_all_clone_intents()]
+
+def test_creates_registers_and_moves():
+    flow, discord, db, guild, member, cog = make_flow(create=0.01, fetch_overwrites=0.02, move=0.01)
+
+    assert asyncio.run(flow.run()) is True
+
+    channel = guild.created[0]
+    assert flow.state == DONE
+    assert member.channel is channel
+    assert db.get_temporary_voice(channel.id).serial_number == 1
+    assert intent_states(db) == []
+    assert cog.session_events == [(channel.id, "create")]
+    assert cog.last_clones == {(MEMBER_ID, PARENT_ID): channel.id}
+    assert not channel.deleted
+
+@pytest.mark.parametrize(
+    "cancel_on, state_at_cancel",
+    [
+        ("create", INTENT),                 # member leaves while the channel is being created
+        ("fetch_overwrites", INTENT),       # while the parent's overwrites are fetched
+        ("apply_overwrites", CREATED),      # while the overwrites are copied to the clone
+    ]
+)
+def test_cancel_before_move_rolls_back(cancel_on, state_at_cancel):
+    flow, discord, db, guild, member, cog = make_flow(create=0.01, fetch_overwrites=0.01, apply_overwrites=0.01)
+    states = []
+    discord.hooks[cancel_on] = lambda: (states.extend(intent_states(db)), flow.cancel())
+
+    assert asyncio.run(flow.run()) is False
+
+    channel = guild.created[0]
+    assert states == [state_at_cancel]
+    assert flow.state == ROLLED_BACK
+    assert channel.deleted
+    assert "move" not in discord.calls
+    assert db.get_temporary_voice(channel.id) is None
+    assert intent_states(db) == []
+    assert cog.session_events == []
+
+def test_cancel_after_configured_rolls_back():
+    flow, discord, db, guild, member, cog = make_flow()
+    set_state = flow.set_state
+
+    def cancel_once_configured(state, channel_id=None):
+        set_state(state, channel_id)
+        if (state == CONFIGURED):
+            flow.cancel()
+    flow.set_state = cancel_once_configured
+
+    assert asyncio.run(flow.run()) is False
+
+    assert guild.created[0].deleted
+    assert "move" not in discord.calls
+    assert intent_states(db) == []
+
+def test_failed_move_rolls_back_registered_clone():
+    flow, discord, db, guild, member, cog = make_flow(move=0.01)
+    discord.errors["move"] = http_error()
+    registered = []
+    discord.hooks["move"] = lambda: registered.append(db.get_temporary_voice(CLONE_ID) is not None)
+
+    assert asyncio.run(flow.run()) is False
+
+    # The clone was registered before the move request, and the rollback removed it again
+    assert registered == [True]
+    assert flow.state == ROLLED_BACK
+    assert guild.created[0].deleted
+    assert db.get_temporary_voice(CLONE_ID) is None
+    assert intent_states(db) == []
+
+def test_failed_creation_releases_serial():
+    flow, discord, db, guild, member, cog = make_flow(create=0.01)
+    discord.errors["create"] = http_error()
+
+    assert asyncio.run(flow.run()) is False
+
+    assert guild.created == []
+    assert "delete" not in discord.calls
+    assert intent_states(db) == []
+    assert db.get_next_serial_number(PARENT_ID) == 1
+
+def test_cancelled_clone_is_kept_when_someone_else_joined():
+    flow, discord, db, guild, member, cog = make_flow(create=0.01, apply_overwrites=0.01)
+    other = SimpleNamespace(id=MEMBER_ID + 1)
+
+    def someone_joins_and_member_leaves():
+        guild.created[0].members.append(other)
+        flow.cancel()
+    discord.hooks["apply_overwrites"] = someone_joins_and_member_leaves
+
+    assert asyncio.run(flow.run()) is False
+
+    channel = guild.created[0]
+    assert not channel.deleted
+    assert "delete" not in discord.calls
+    assert db.get_temporary_voice(channel.id) is not None
+    assert intent_states(db) == []
+    assert cog.session_events == [(channel.id, "create")]
+
+def test_failed_registration_rolls_back_without_moving():
+    flow, discord, db, guild, member, cog = make_flow()
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("disk I/O error")
+    db.register_clone_intent = fail
+
+    assert asyncio.run(flow.run()) is False
+
+    assert guild.created[0].deleted
+    assert "move" not in discord.calls
+    assert member.channel is None
+    assert intent_states(db) == []
+
+def test_serial_stays_reserved_while_flow_runs():
+    flow, discord, db, guild, member, cog = make_flow(create=0.02)
+    serials = []
+
+    async def run_two():
+        task = asyncio.ensure_future(flow.run())
+        await asyncio.sleep(0.01)
+        serials.append(db.get_next_serial_number(PARENT_ID))
+        await task
+
+    asyncio.run(run_two())
+
+    assert flow.serial == 1
+    assert serials == [2]
+    assert intent_states(db) == []
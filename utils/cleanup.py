@@ -0,0 +1,45 @@
+import disnake
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+async def delete_channels(
+    channels: List[disnake.abc.GuildChannel],
+    reason: str,
+    concurrency: int = 5,
+    retries: int = 3,
+    on_progress: Optional[Callable[[int, int], Awaitable[None]]] = None
+) -> int:
+    """
+    Delete channels with at most `concurrency` requests in flight.
+    A rate limited deletion waits for the time Discord asked for and is retried. Returns the number of deleted channels.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    total = len(channels)
+    done = 0
+    deleted = 0
+
+    async def delete(channel: disnake.abc.GuildChannel):
+        nonlocal done, deleted
+        async with semaphore:
+            for _ in range(retries):
+                try:
+                    await channel.delete(reason=reason)
+                    deleted += 1
+                    break
+                except disnake.NotFound:
+                    break # Channel was already deleted
+                except disnake.HTTPException as e:
+                    if (e.status != 429):
+                        logger.warning("Error deleting channel: %s", e, extra={"channel_id": channel.id})
+                        break
+                    retry_after = float(e.response.headers.get("Retry-After", 1))
+                    await asyncio.sleep(retry_after)
+        done += 1
+        if (on_progress is not None):
+            await on_progress(done, total)
+
+    await asyncio.gather(*(delete(channel) for channel in channels))
+    return deleted
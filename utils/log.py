@@ -0,0 +1,95 @@
+import logging
+import logging.handlers
+import json
+import queue
+import random
+from datetime import datetime, timezone
+from typing import Optional
+
+# Attributes every LogRecord has, anything else was passed through `extra` and is logged as a field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+class JsonFormatter(logging.Formatter):
+    """Formats log records as single line JSON objects."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that leaves formatting to the listener thread.
+    The default one formats every record in the emitting thread, which is the event loop here.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+class SamplingFilter(logging.Filter):
+    """Keeps only a share of records below WARNING, warnings and errors always pass. Spans are sampled per trace instead."""
+
+    def __init__(self, sample_rate: float):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.sample_rate >= 1 or record.name.startswith("tracing"):
+            return True
+        return random.random() < self.sample_rate
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def setup_logging(level: str = "INFO", sample_rate: float = 1.0, trace_path: Optional[str] = None) -> None:
+    """
+    Route all bot logs through a queue that is drained by a background thread,
+    which formats them as JSON and writes them to stderr (and trace spans to a JSONL file if a path is given).
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue = queue.SimpleQueue()
+
+    formatter = JsonFormatter()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(formatter)
+    handlers = [stream_handler]
+
+    if trace_path:
+        # Spans are only written to the trace file, see utils.tracing
+        stream_handler.addFilter(lambda record: not record.name.startswith("tracing"))
+        trace_handler = logging.FileHandler(trace_path, encoding="utf-8")
+        trace_handler.setFormatter(formatter)
+        trace_handler.addFilter(logging.Filter("tracing"))
+        handlers.append(trace_handler)
+
+    queue_handler = DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(queue_handler)
+
+    tracing_logger = logging.getLogger("tracing")
+    tracing_logger.setLevel(logging.DEBUG if trace_path else logging.CRITICAL)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+def shutdown_logging() -> None:
+    """Write out the queued records and stop the background thread."""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
@@ -0,0 +1,144 @@
+import mmap
+import os
+import struct
+import zlib
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+from db.records import TemporaryVoice
+
+# Layout, little endian: header, then every section as a record count followed by its records, then CRC32 of all of it
+MAGIC = b"CVSN"
+VERSION = 2
+HEADER = struct.Struct("<4sHQd")        # magic, version, database generation, written at
+COUNT = struct.Struct("<I")
+INTERACTION = struct.Struct("<QQQdQi")  # message id, channel id, author id, expires at, parent id or 0, name template length or -1
+USER_BUCKET = struct.Struct("<QQdddQ")  # user id, parent id, tokens, updated at, full at, last clone id or 0
+PARENT_BUCKET = struct.Struct("<QdddQ") # parent id, tokens, updated at, full at, last clone id or 0
+DELETION = struct.Struct("<QQQQ")       # channel id, parent voice id, guild id, serial number
+CHECKSUM = struct.Struct("<I")
+
+class InteractionTimer(NamedTuple):
+    message_id: int
+    channel_id: Optional[int]
+    author_id: int
+    expires_at: float
+    parent_id: Optional[int]
+    name_template: Optional[str]
+
+class UserBucketState(NamedTuple):
+    user_id: int
+    parent_id: int
+    tokens: float
+    updated_at: float
+    full_at: float
+    clone_id: Optional[int]
+
+class ParentBucketState(NamedTuple):
+    parent_id: int
+    tokens: float
+    updated_at: float
+    full_at: float
+    clone_id: Optional[int]
+
+class VoiceSnapshot(NamedTuple):
+    """In-memory state of the bot that is not stored in the database. Times are unix timestamps."""
+    generation: int
+    written_at: float
+    interactions: List[InteractionTimer]
+    user_buckets: List[UserBucketState]
+    parent_buckets: List[ParentBucketState]
+    deletions: List[TemporaryVoice]
+
+def encode_snapshot(snapshot: VoiceSnapshot) -> bytes:
+    """Serialize a snapshot."""
+    parts = [HEADER.pack(MAGIC, VERSION, snapshot.generation, snapshot.written_at)]
+
+    parts.append(COUNT.pack(len(snapshot.interactions)))
+    for interaction in snapshot.interactions:
+        template = interaction.name_template.encode() if interaction.name_template is not None else b""
+        parts.append(INTERACTION.pack(
+            interaction.message_id,
+            interaction.channel_id or 0,
+            interaction.author_id,
+            interaction.expires_at,
+            interaction.parent_id or 0,
+            len(template) if interaction.name_template is not None else -1
+        ))
+        parts.append(template)
+
+    parts.append(COUNT.pack(len(snapshot.user_buckets)))
+    parts.extend(USER_BUCKET.pack(*bucket[:-1], bucket.clone_id or 0) for bucket in snapshot.user_buckets)
+
+    parts.append(COUNT.pack(len(snapshot.parent_buckets)))
+    parts.extend(PARENT_BUCKET.pack(*bucket[:-1], bucket.clone_id or 0) for bucket in snapshot.parent_buckets)
+
+    parts.append(COUNT.pack(len(snapshot.deletions)))
+    parts.extend(DELETION.pack(*deletion) for deletion in snapshot.deletions)
+
+    data = b"".join(parts)
+    return data + CHECKSUM.pack(zlib.crc32(data))
+
+def write_snapshot(path: str, snapshot: VoiceSnapshot) -> int:
+    """Atomically replace the snapshot file, returns its size."""
+    data = encode_snapshot(snapshot)
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, path)
+    return len(data)
+
+def _records(data: memoryview, offset: int, record: struct.Struct) -> Tuple[Iterator[tuple], int]:
+    count, = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    return record.iter_unpack(data[offset:offset + count * record.size]), offset + count * record.size
+
+def decode_snapshot(data: memoryview) -> Optional[VoiceSnapshot]:
+    """Deserialize a snapshot, None if it is corrupted or of another version."""
+    if (len(data) < HEADER.size + CHECKSUM.size):
+        return None
+    checksum, = CHECKSUM.unpack_from(data, len(data) - CHECKSUM.size)
+    body = data[:len(data) - CHECKSUM.size]
+    if (zlib.crc32(body) != checksum):
+        return None
+    magic, version, generation, written_at = HEADER.unpack_from(body, 0)
+    if (magic != MAGIC or version != VERSION):
+        return None
+    offset = HEADER.size
+
+    interactions = []
+    count, = COUNT.unpack_from(body, offset)
+    offset += COUNT.size
+    for _ in range(count):
+        message_id, channel_id, author_id, expires_at, parent_id, template_length = INTERACTION.unpack_from(body, offset)
+        offset += INTERACTION.size
+        name_template = None
+        if (template_length >= 0):
+            name_template = bytes(body[offset:offset + template_length]).decode()
+            offset += template_length
+        interactions.append(InteractionTimer(message_id, channel_id or None, author_id, expires_at, parent_id or None, name_template))
+
+    records, offset = _records(body, offset, USER_BUCKET)
+    user_buckets = [UserBucketState(*values[:-1], values[-1] or None) for values in records]
+    records, offset = _records(body, offset, PARENT_BUCKET)
+    parent_buckets = [ParentBucketState(*values[:-1], values[-1] or None) for values in records]
+    records, offset = _records(body, offset, DELETION)
+    deletions = list(map(TemporaryVoice._make, records))
+
+    return VoiceSnapshot(generation, written_at, interactions, user_buckets, parent_buckets, deletions)
+
+def read_snapshot(path: str) -> Optional[VoiceSnapshot]:
+    """Read a snapshot file through a memory map, None if there is no valid one."""
+    try:
+        with open(path, "rb") as file:
+            if (os.fstat(file.fileno()).st_size == 0):
+                return None
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                with memoryview(view) as data:
+                    try:
+                        return decode_snapshot(data)
+                    except (struct.error, UnicodeDecodeError):
+                        return None
+    except FileNotFoundError:
+        return None
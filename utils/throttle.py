@@ -0,0 +1,128 @@
+from collections import OrderedDict
+from typing import Hashable, Optional
+import time
+
+from db.records import ParentVoice
+
+class TokenBucket:
+    """Token bucket of a single throttle key, refilled lazily on access."""
+    __slots__ = ("tokens", "updated", "full_at", "clone_id")
+
+    def __init__(self, capacity: int, now: float):
+        self.tokens = float(capacity)
+        self.updated = now
+        self.full_at = now
+        # Last clone handed out for this key, used to send throttled users back to it
+        self.clone_id: Optional[int] = None
+
+    def refill(self, capacity: int, period: float, now: float) -> None:
+        """Add the tokens accumulated since the last access."""
+        rate = capacity / period
+        self.tokens = min(float(capacity), self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        self.full_at = now + (capacity - self.tokens) / rate
+
+class Throttle:
+    """
+    Registry of token buckets that evicts idle keys.
+    Buckets are kept in access order, so the ones that have been refilled completely
+    (and therefore carry no state) are dropped from the front on every access.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self.buckets: "OrderedDict[Hashable, TokenBucket]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.buckets)
+
+    def get(self, key: Hashable, capacity: int, period: float, now: float) -> TokenBucket:
+        """Get a refilled bucket for a key, creating a full one if the key is unknown."""
+        self.evict(now)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(capacity, now)
+            self.buckets[key] = bucket
+        else:
+            bucket.refill(capacity, period, now)
+            self.buckets.move_to_end(key)
+        return bucket
+
+    def peek(self, key: Hashable) -> Optional[TokenBucket]:
+        """Get a bucket for a key without refilling it or changing its order."""
+        return self.buckets.get(key)
+
+    def restore(self, key: Hashable, tokens: float, updated: float, full_at: float, clone_id: Optional[int]) -> None:
+        """Put back a bucket saved before a restart, with times on this process' monotonic clock."""
+        bucket = TokenBucket(0, updated)
+        bucket.tokens = tokens
+        bucket.full_at = full_at
+        bucket.clone_id = clone_id
+        self.buckets[key] = bucket
+
+    def evict(self, now: float) -> None:
+        """Drop idle buckets from the front, and the least recently used ones above max_size."""
+        while self.buckets:
+            key, bucket = next(iter(self.buckets.items()))
+            if (bucket.full_at > now and len(self.buckets) < self.max_size):
+                break
+            del self.buckets[key]
+
+class JoinThrottle:
+    """Throttles clone creation per (user, parent voice) and per parent voice."""
+
+    def __init__(
+        self,
+        user_joins: int,
+        user_period: float,
+        parent_joins: int,
+        parent_period: float,
+        max_size: int = 10000
+    ):
+        self.user_joins = user_joins
+        self.user_period = user_period
+        self.parent_joins = parent_joins
+        self.parent_period = parent_period
+
+        self.user_buckets = Throttle(max_size)
+        self.parent_buckets = Throttle(max_size)
+
+    def get_limits(self, parent_result: ParentVoice):
+        """Returns (user_joins, user_period, parent_joins, parent_period) of a parent voice, falling back to the defaults."""
+        return (
+            parent_result.user_joins or self.user_joins,
+            parent_result.user_period or self.user_period,
+            parent_result.parent_joins or self.parent_joins,
+            parent_result.parent_period or self.parent_period,
+        )
+
+    def acquire(self, user_id: int, parent_result: ParentVoice, now: Optional[float] = None) -> bool:
+        """Take a token from both the user's and the parent's bucket. Returns False if either of them is empty."""
+        if now is None:
+            now = time.monotonic()
+        user_joins, user_period, parent_joins, parent_period = self.get_limits(parent_result)
+        parent_id = parent_result.channel_id
+
+        user_bucket = self.user_buckets.get((user_id, parent_id), user_joins, user_period, now)
+        parent_bucket = self.parent_buckets.get(parent_id, parent_joins, parent_period, now)
+        if (user_bucket.tokens < 1 or parent_bucket.tokens < 1):
+            return False
+
+        user_bucket.tokens -= 1
+        parent_bucket.tokens -= 1
+        user_bucket.refill(user_joins, user_period, now)
+        parent_bucket.refill(parent_joins, parent_period, now)
+        return True
+
+    def set_last_clone(self, user_id: int, parent_id: int, clone_id: int) -> None:
+        """Remember the clone that was created for a user."""
+        bucket = self.user_buckets.peek((user_id, parent_id))
+        if bucket is not None:
+            bucket.clone_id = clone_id
+
+    def get_last_clone(self, user_id: int, parent_id: int) -> Optional[int]:
+        """Returns id of the last clone created for a user, if the user is still tracked."""
+        bucket = self.user_buckets.peek((user_id, parent_id))
+        if bucket is None:
+            return None
+        return bucket.clone_id
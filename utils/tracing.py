@@ -0,0 +1,104 @@
+import contextvars
+import functools
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger("tracing")
+
+# Share of root spans (and therefore whole traces) that are written out
+_sample_rate = 1.0
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+def set_trace_sample_rate(sample_rate: float) -> None:
+    global _sample_rate
+    _sample_rate = sample_rate
+
+def _new_id() -> str:
+    return os.urandom(8).hex()
+
+class Span:
+    """A timed operation, linked to the operation that started it through parent_id."""
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "sampled", "start", "duration", "attributes", "error")
+
+    def __init__(self, name: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.name = name
+        self.span_id = _new_id()
+        if parent is None:
+            self.trace_id = _new_id()
+            self.parent_id = None
+            self.sampled = random.random() < _sample_rate
+        else:
+            self.trace_id = parent.trace_id
+            self.parent_id = parent.span_id
+            self.sampled = parent.sampled
+        self.start = time.time()
+        self.duration: Optional[float] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    def set(self, **attributes: Any) -> None:
+        """Attach more attributes to the span."""
+        self.attributes.update(attributes)
+
+class _NoopSpan:
+    """Stands in for spans while tracing is disabled, so nothing is timed or generated."""
+    __slots__ = ()
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+_NOOP_SPAN = _NoopSpan()
+
+@contextmanager
+def trace(name: str, **attributes: Any):
+    """
+    Time the enclosed block as a span, nested under the span that is currently open in this task.
+    Works across awaits, since the current span is kept in a context variable.
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        # Tracing is disabled, spans would never be written
+        yield _NOOP_SPAN
+        return
+    span = Span(name, _current_span.get(), attributes)
+    token = _current_span.set(span)
+    started = time.perf_counter()
+    try:
+        yield span
+    except BaseException as e:
+        span.error = repr(e)
+        raise
+    finally:
+        span.duration = time.perf_counter() - started
+        _current_span.reset(token)
+        if span.sampled and logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                span.name,
+                extra={
+                    "trace_id": span.trace_id,
+                    "span_id": span.span_id,
+                    "parent_id": span.parent_id,
+                    "start": span.start,
+                    "duration_ms": round(span.duration * 1000, 3),
+                    "attributes": span.attributes,
+                    "error": span.error,
+                }
+            )
+
+def traced(name: Optional[str] = None):
+    """Decorator that runs every call of a (sync) function inside a span."""
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not logger.isEnabledFor(logging.DEBUG):
+                return func(*args, **kwargs)
+            with trace(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,118 @@
+import asyncio
+import gc
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class LoopWatchdog:
+    """
+    Measures event loop health: how late the loop wakes up, callbacks that block it, pending tasks and GC pauses.
+    A task inside the loop keeps a heartbeat, while a separate thread logs the loop's stack whenever
+    the heartbeat stalls for longer than slow_callback seconds.
+    """
+
+    def __init__(self, interval: float = 0.25, slow_callback: float = 0.25):
+        self.interval = interval
+        self.slow_callback = slow_callback
+
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.loop_thread_id: Optional[int] = None
+        self.measure_task: Optional[asyncio.Task] = None
+        self.monitor_thread: Optional[threading.Thread] = None
+        self.stopped = threading.Event()
+
+        self.heartbeat = time.monotonic()
+        self.lag = 0.0
+        self.average_lag = 0.0
+        self.max_lag = 0.0
+        self.slow_callbacks = 0
+        self.pending_tasks = 0
+
+        self.gc_started: Optional[float] = None
+        self.gc_collections = 0
+        self.gc_total_pause = 0.0
+        self.gc_max_pause = 0.0
+        self.gc_last_pause = 0.0
+
+    def start(self) -> None:
+        """Start watching the running event loop."""
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread_id = threading.get_ident()
+        self.stopped.clear()
+        self.heartbeat = time.monotonic()
+
+        gc.callbacks.append(self.on_gc)
+        self.measure_task = self.loop.create_task(self.measure())
+        self.monitor_thread = threading.Thread(target=self.monitor, name="loop-watchdog", daemon=True)
+        self.monitor_thread.start()
+
+    def stop(self) -> None:
+        """Stop watching the event loop."""
+        self.stopped.set()
+        if self.measure_task is not None:
+            self.measure_task.cancel()
+            self.measure_task = None
+        if self.on_gc in gc.callbacks:
+            gc.callbacks.remove(self.on_gc)
+
+    async def measure(self) -> None:
+        """Sleep for a fixed interval and record how late the loop woke up."""
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+
+            self.lag = max(now - expected, 0.0)
+            self.average_lag = self.average_lag * 0.9 + self.lag * 0.1
+            self.max_lag = max(self.max_lag, self.lag)
+            self.pending_tasks = len(asyncio.all_tasks(self.loop))
+            self.heartbeat = now
+
+    def monitor(self) -> None:
+        """Log the loop thread's stack once per stall of the heartbeat."""
+        reported_heartbeat = None
+        while not self.stopped.wait(self.interval):
+            heartbeat = self.heartbeat
+            stalled = time.monotonic() - heartbeat - self.interval
+            if (stalled < self.slow_callback or heartbeat == reported_heartbeat):
+                continue
+
+            reported_heartbeat = heartbeat
+            self.slow_callbacks += 1
+            frame = sys._current_frames().get(self.loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else ""
+            logger.warning(
+                "Event loop is blocked for %.3f seconds", stalled,
+                extra={"stalled_seconds": round(stalled, 3), "stack": stack}
+            )
+
+    def on_gc(self, phase: str, info: Dict[str, Any]) -> None:
+        """Time garbage collector runs."""
+        if phase == "start":
+            self.gc_started = time.perf_counter()
+        elif self.gc_started is not None:
+            pause = time.perf_counter() - self.gc_started
+            self.gc_started = None
+            self.gc_collections += 1
+            self.gc_total_pause += pause
+            self.gc_last_pause = pause
+            self.gc_max_pause = max(self.gc_max_pause, pause)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the current loop health figures."""
+        return {
+            "lag": self.lag,
+            "average_lag": self.average_lag,
+            "max_lag": self.max_lag,
+            "slow_callbacks": self.slow_callbacks,
+            "pending_tasks": self.pending_tasks,
+            "gc_collections": self.gc_collections,
+            "gc_total_pause": self.gc_total_pause,
+            "gc_max_pause": self.gc_max_pause,
+            "gc_last_pause": self.gc_last_pause,
+        }
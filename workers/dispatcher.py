@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import multiprocessing
+from typing import Any, Callable, Dict, List, Optional
+
+from workers.restWorker import run_worker
+
+logger = logging.getLogger(__name__)
+
+ResultHandler = Callable[[Dict[str, Any]], None]
+
+class JobDispatcher:
+    """
+    Gateway side of the REST worker pool. Jobs are routed to workers by their key, so all jobs of one
+    channel go through the same worker's queue and keep their order. Results come back through a single
+    queue and are passed to the registered handlers on the gateway's event loop.
+    """
+
+    def __init__(self, token: str, db_path: str, workers: int = 2, log_level: str = "INFO"):
+        self.token = token
+        self.db_path = db_path
+        self.workers = workers
+        self.log_level = log_level
+
+        self.context = multiprocessing.get_context("spawn")
+        self.manager = None
+        self.blocked_until = None
+        # Job ids the gateway has cancelled, shared with the workers: job_id: True
+        self.cancelled = None
+        self.cancelled_ids = set()
+        self.job_queues: List[multiprocessing.Queue] = []
+        self.processes: List[multiprocessing.Process] = []
+        self.result_queue: Optional[multiprocessing.Queue] = None
+        self.result_task: Optional[asyncio.Task] = None
+        self.result_handlers: List[ResultHandler] = []
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.restarts = 0
+
+    def start(self) -> None:
+        """Spawn the worker processes and start reading their results."""
+        self.manager = self.context.Manager()
+        self.blocked_until = self.manager.dict()
+        self.cancelled = self.manager.dict()
+        self.result_queue = self.context.Queue()
+        for index in range(self.workers):
+            self.job_queues.append(self.context.Queue())
+            self.processes.append(self.spawn(index))
+        self.result_task = asyncio.get_running_loop().create_task(self.read_results())
+
+    def spawn(self, index: int) -> multiprocessing.Process:
+        process = self.context.Process(
+            target=run_worker,
+            args=(
+                index, self.token, self.db_path, self.job_queues[index], self.result_queue,
+                self.blocked_until, self.cancelled, self.log_level
+            ),
+            name=f"rest-worker-{index}",
+            daemon=True
+        )
+        process.start()
+        return process
+
+    async def stop(self, timeout: float = 10) -> None:
+        """Let the workers finish the jobs they have, handle their results and stop them."""
+        for job_queue in self.job_queues:
+            job_queue.put(None)
+        for process in self.processes:
+            await asyncio.to_thread(process.join, timeout)
+            if (process.is_alive()):
+                process.terminate()
+        if (self.result_task is not None):
+            # Queued after the last results, so the reader handles all of them before it stops
+            self.result_queue.put(None)
+            await self.result_task
+        if (self.manager is not None):
+            self.manager.shutdown()
+
+    def add_result_handler(self, handler: ResultHandler) -> None:
+        self.result_handlers.append(handler)
+
+    def submit(self, job: Dict[str, Any]) -> None:
+        """Queue a job on the worker responsible for its key."""
+        index = job["key"] % len(self.job_queues)
+        if (not self.processes[index].is_alive()):
+            # Jobs left in the queue of a crashed worker are taken by its replacement
+            logger.warning("REST worker has died, restarting it", extra={"worker": index, "exitcode": self.processes[index].exitcode})
+            self.processes[index] = self.spawn(index)
+            self.restarts += 1
+        self.job_queues[index].put(job)
+        self.submitted += 1
+
+    def cancel(self, job_id: int) -> None:
+        """Ask the worker running a job to stop it at its next step, jobs that don't check for it run to completion."""
+        if (job_id in self.cancelled_ids):
+            return
+        self.cancelled_ids.add(job_id)
+        self.cancelled[job_id] = True
+
+    async def read_results(self) -> None:
+        while True:
+            result = await asyncio.to_thread(self.result_queue.get)
+            if (result is None):
+                return
+            self.completed += 1
+            if (result["id"] in self.cancelled_ids):
+                self.cancelled_ids.discard(result["id"])
+                self.cancelled.pop(result["id"], None)
+            if (not result.get("ok")):
+                self.failed += 1
+            for handler in self.result_handlers:
+                try:
+                    handler(result)
+                except Exception:
+                    logger.exception("Error handling job result", extra={"job_id": result.get("id")})
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the job counters of the pool."""
+        return {
+            "workers": sum(process.is_alive() for process in self.processes),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "pending": self.submitted - self.completed,
+            "restarts": self.restarts,
+        }
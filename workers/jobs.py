@@ -0,0 +1,55 @@
+from typing import Any, Dict, Optional
+import itertools
+
+# Jobs are plain dicts, so they can be passed through multiprocessing queues as they are.
+# Every job has an "id", a "type" and an ordering "key": jobs with the same key are executed in the order they were submitted.
+
+CLONE = "clone"
+DELETE = "delete"
+MOVE = "move"
+
+_ids = itertools.count(1)
+
+def clone_job(
+    guild_id: int,
+    parent_channel_id: int,
+    member_id: int,
+    intent_id: int,
+    name: str,
+    settings: Dict[str, Any],
+    cancel_reason: Optional[str] = None
+) -> Dict[str, Any]:
+    """Create a clone of a parent voice channel, register it and move the member into it."""
+    return {
+        "id": next(_ids),
+        "type": CLONE,
+        "key": parent_channel_id,
+        "guild_id": guild_id,
+        "parent_channel_id": parent_channel_id,
+        "member_id": member_id,
+        "intent_id": intent_id,
+        "name": name,
+        "settings": settings,
+        "cancel_reason": cancel_reason,
+    }
+
+def delete_job(channel_id: int, reason: Optional[str] = None) -> Dict[str, Any]:
+    """Delete a channel."""
+    return {
+        "id": next(_ids),
+        "type": DELETE,
+        "key": channel_id,
+        "channel_id": channel_id,
+        "reason": reason,
+    }
+
+def move_job(guild_id: int, member_id: int, channel_id: int) -> Dict[str, Any]:
+    """Move a member into a voice channel."""
+    return {
+        "id": next(_ids),
+        "type": MOVE,
+        "key": channel_id,
+        "guild_id": guild_id,
+        "member_id": member_id,
+        "channel_id": channel_id,
+    }
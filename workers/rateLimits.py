@@ -0,0 +1,34 @@
+import asyncio
+import time
+from typing import Any, Dict, Mapping, MutableMapping, Optional
+
+GLOBAL = "global"
+
+class SharedRateLimits:
+    """
+    Rate limits shared by all REST worker processes through a multiprocessing manager dict of
+    route key: unix time until which the route is exhausted. Once any worker learns that a bucket is
+    exhausted, from the response headers or a 429, every worker holds its requests to that route.
+    """
+
+    def __init__(self, blocked_until: MutableMapping[str, float]):
+        self.blocked_until = blocked_until
+
+    async def wait(self, route_key: str) -> None:
+        """Sleep until neither the route nor the whole bot is rate limited."""
+        while True:
+            until = max(self.blocked_until.get(route_key, 0.0), self.blocked_until.get(GLOBAL, 0.0))
+            delay = until - time.time()
+            if (delay <= 0):
+                return
+            await asyncio.sleep(delay)
+
+    def update(self, route_key: str, status: int, headers: Mapping[str, str], body: Optional[Dict[str, Any]] = None) -> None:
+        """Record what a response tells about the route's bucket."""
+        body = body or {}
+        if (status == 429):
+            retry_after = float(body.get("retry_after", headers.get("Retry-After", 1)))
+            key = GLOBAL if (body.get("global") or headers.get("X-RateLimit-Global")) else route_key
+            self.blocked_until[key] = time.time() + retry_after
+        elif (headers.get("X-RateLimit-Remaining") == "0"):
+            self.blocked_until[route_key] = time.time() + float(headers.get("X-RateLimit-Reset-After", 1))
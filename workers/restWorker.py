@@ -0,0 +1,234 @@
+import aiohttp
+import asyncio
+import logging
+import multiprocessing
+from typing import Any, Dict, Mapping, Optional
+from urllib.parse import quote
+
+from db.db import Database
+from cogs.VoiceUpdates.cloneFlow import CREATED, MOVING, CloneCancelled
+from utils.log import setup_logging
+from utils.tracing import trace
+from workers import jobs
+from workers.rateLimits import SharedRateLimits
+
+logger = logging.getLogger(__name__)
+
+API_BASE = "https://discord.com/api/v10"
+UNKNOWN_CHANNEL = 10003
+
+class RestError(Exception):
+    """Raised when Discord answers a request with an error status."""
+
+    def __init__(self, status: int, data: Any):
+        self.status = status
+        self.code = data.get("code", 0) if isinstance(data, dict) else 0
+        message = data.get("message", "") if isinstance(data, dict) else str(data or "")
+        super().__init__(f"{status} (error code: {self.code}): {message}")
+
+class RestWorker:
+    """
+    Executes jobs sent by the gateway process against Discord's REST API.
+    Jobs with the same key are run one after another in the order they arrived, jobs with different keys concurrently.
+    """
+
+    def __init__(
+        self,
+        index: int,
+        token: str,
+        db: Database,
+        job_queue: multiprocessing.Queue,
+        result_queue: multiprocessing.Queue,
+        rate_limits: SharedRateLimits,
+        cancelled: Mapping[int, bool],
+        retries: int = 3
+    ):
+        self.index = index
+        self.token = token
+        self.db = db
+        self.job_queue = job_queue
+        self.result_queue = result_queue
+        self.rate_limits = rate_limits
+        self.cancelled = cancelled
+        self.retries = retries
+
+        self.session: Optional[aiohttp.ClientSession] = None
+        # Last job of every key that is still running: key: task
+        self.chains: Dict[int, asyncio.Task] = {}
+        self.executors = {
+            jobs.CLONE: self.clone,
+            jobs.DELETE: self.delete,
+            jobs.MOVE: self.move,
+        }
+
+    async def run(self) -> None:
+        """Take jobs from the queue until the gateway sends None."""
+        headers = {"Authorization": f"Bot {self.token}"}
+        async with aiohttp.ClientSession(headers=headers) as session:
+            self.session = session
+            loop = asyncio.get_running_loop()
+            while True:
+                job = await asyncio.to_thread(self.job_queue.get)
+                if (job is None):
+                    break
+                key = job["key"]
+                task = loop.create_task(self.run_job(job, self.chains.get(key)))
+                self.chains[key] = task
+                task.add_done_callback(lambda task, key=key: self.release_chain(key, task))
+            # Finish the jobs that were already taken
+            await asyncio.gather(*self.chains.values(), return_exceptions=True)
+
+    def release_chain(self, key: int, task: asyncio.Task) -> None:
+        if (self.chains.get(key) is task):
+            del self.chains[key]
+
+    async def run_job(self, job: Dict[str, Any], previous: Optional[asyncio.Task]) -> None:
+        if (previous is not None):
+            # A failed previous job must not stop the next one
+            await asyncio.wait([previous])
+
+        with trace(f"job.{job['type']}", job_id=job["id"], worker=self.index):
+            try:
+                result = await self.executors[job["type"]](job)
+            except (RestError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning("Error executing job: %s", e, extra={"job_id": job["id"], "job_type": job["type"]})
+                result = {"ok": False, "error": str(e)}
+            except Exception as e:
+                logger.exception("Unexpected error executing job", extra={"job_id": job["id"], "job_type": job["type"]})
+                result = {"ok": False, "error": str(e)}
+        result.update(id=job["id"], type=job["type"], key=job["key"])
+        self.result_queue.put(result)
+
+    async def request(self, method: str, path: str, json: Any = None, reason: Optional[str] = None, **parameters: int) -> Any:
+        """
+        Send a request, waiting out rate limits shared with the other workers.
+        Like disnake's routes, the rate limit key is the method and path with the channel or guild id.
+        """
+        url = API_BASE + path.format(**parameters)
+        major_parameter = parameters.get("channel_id", parameters.get("guild_id"))
+        route_key = f"{method} {path} {major_parameter}"
+        headers = {"X-Audit-Log-Reason": quote(reason, safe="/ ")} if reason else {}
+
+        for attempt in range(self.retries):
+            await self.rate_limits.wait(route_key)
+            async with self.session.request(method, url, json=json, headers=headers) as response:
+                if (response.content_type == "application/json"):
+                    data = await response.json()
+                else:
+                    data = await response.text()
+                self.rate_limits.update(route_key, response.status, response.headers, data if isinstance(data, dict) else None)
+
+                if (response.status < 300):
+                    return data
+                if (response.status == 429):
+                    continue
+                if (response.status >= 500 and attempt < self.retries - 1):
+                    await asyncio.sleep(1 + attempt * 2)
+                    continue
+                raise RestError(response.status, data)
+        raise RestError(response.status, data)
+
+    async def delete_channel(self, channel_id: int, reason: Optional[str]) -> None:
+        try:
+            await self.request("DELETE", "/channels/{channel_id}", reason=reason, channel_id=channel_id)
+        except RestError as e:
+            if (e.code != UNKNOWN_CHANNEL):
+                raise
+            # Channel was already deleted
+
+    def check_cancelled(self, job: Dict[str, Any]) -> None:
+        if (job["id"] in self.cancelled):
+            raise CloneCancelled()
+
+    async def clone(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a clone, register it as a temporary voice and move the member into it."""
+        guild_id = job["guild_id"]
+        parent_channel_id = job["parent_channel_id"]
+        intent_id = job["intent_id"]
+        result = {"guild_id": guild_id, "parent_channel_id": parent_channel_id, "member_id": job["member_id"]}
+
+        channel_id = None
+        registered = False
+        moving = False
+        try:
+            self.check_cancelled(job)
+            payload = dict(job["settings"], type=2, name=job["name"])
+            try:
+                # Raw overwrites of the parent, with every permission the gateway's cache may lack
+                parent = await self.request("GET", "/channels/{channel_id}", channel_id=parent_channel_id)
+                payload["permission_overwrites"] = parent.get("permission_overwrites", [])
+            except (RestError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning("Error fetching channel permissions: %s", e, extra={"channel_id": parent_channel_id})
+            self.check_cancelled(job)
+
+            channel = await self.request("POST", "/guilds/{guild_id}/channels", json=payload, guild_id=guild_id)
+            channel_id = int(channel["id"])
+            result["channel_id"] = channel_id
+            self.db.update_clone_intent(intent_id, CREATED, channel_id)
+            # The gateway cancels the job once the member has left the parent voice
+            self.check_cancelled(job)
+
+            # Registered before the move, so the gateway already knows the clone when the member's voice event arrives
+            self.db.register_clone_intent(intent_id, MOVING, channel_id)
+            registered = True
+            self.db.delete_clone_intent(intent_id)
+
+            moving = True
+            await self.request(
+                "PATCH", "/guilds/{guild_id}/members/{member_id}",
+                json={"channel_id": str(channel_id)}, guild_id=guild_id, member_id=job["member_id"]
+            )
+        except Exception as e:
+            # Once the intent is persisted, any failure removes the clone, so no empty clone or reserved serial is left
+            await self.rollback_clone(intent_id, channel_id, registered, job["cancel_reason"])
+            if (not (isinstance(e, CloneCancelled) or (moving and isinstance(e, RestError)))):
+                raise
+            # The member has left the parent voice before the clone was ready
+            result["ok"] = False
+            result["cancelled"] = True
+            return result
+
+        result["ok"] = True
+        return result
+
+    async def rollback_clone(self, intent_id: int, channel_id: Optional[int], registered: bool, reason: Optional[str]) -> None:
+        """Delete the records and the channel of a clone that could not be finished."""
+        self.db.delete_clone_intent(intent_id, rollback=True)
+        if (channel_id is None):
+            return
+        if (registered and not self.db.delete_temporary_voice(channel_id)):
+            # The gateway has already deleted the empty clone
+            return
+        await self.delete_channel(channel_id, reason)
+
+    async def delete(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Delete a channel, the gateway has already removed its temporary voice."""
+        await self.delete_channel(job["channel_id"], job["reason"])
+        return {"ok": True, "channel_id": job["channel_id"]}
+
+    async def move(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Move a member into a voice channel."""
+        await self.request(
+            "PATCH", "/guilds/{guild_id}/members/{member_id}",
+            json={"channel_id": str(job["channel_id"])}, guild_id=job["guild_id"], member_id=job["member_id"]
+        )
+        return {"ok": True, "channel_id": job["channel_id"], "member_id": job["member_id"]}
+
+def run_worker(
+    index: int,
+    token: str,
+    db_path: str,
+    job_queue: multiprocessing.Queue,
+    result_queue: multiprocessing.Queue,
+    blocked_until: Dict[str, float],
+    cancelled: Dict[int, bool],
+    log_level: str
+) -> None:
+    """Entry point of a REST worker process."""
+    setup_logging(level = log_level)
+    db = Database(db_path)
+    worker = RestWorker(index, token, db, job_queue, result_queue, SharedRateLimits(blocked_until), cancelled)
+    try:
+        asyncio.run(worker.run())
+    finally:
+        db.close()